@@ -1,80 +1,167 @@
 import uuid
 import os
-import urllib.request
+import io
 import time
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from urllib.parse import urlparse
+from PIL import Image
+from automation.imageDownloader import get_downloader
 
-# This downloads all pictures into a folder labelled by the profile's name, age, and a uuid
-# browser: cefpython3 browser object
-# data_folder: where to save images
+class UrlHarvestChannel:
+    """
+    Long-lived channel from the page to Python: a CEF JavaScript binding that resolves a Future per harvest request.
+    Replaces binding a one-shot HTTPServer on port 54321 and polling for a temp file on every profile.
+    """
+    JS_FUNCTION = "bumblebotReceiveUrls"
 
-def find_download_all_pictures(browser, data_folder):
+    def __init__(self):
+        self.pending = {}
+        self.lock = threading.Lock()
+
+    def bind(self, browser):
+        # Must run before the page is loaded, bindings are attached when the JS context is created
+        from cefpython3 import cefpython as cef
+        bindings = cef.JavascriptBindings(bindToFrames=False, bindToPopups=False)
+        bindings.SetFunction(self.JS_FUNCTION, self.receive)
+        browser.SetJavascriptBindings(bindings)
+
+    def receive(self, request_id, urls):
+        # Called by CEF on the UI thread. Answers to requests that already timed out have no pending Future and are dropped
+        with self.lock:
+            future = self.pending.pop(request_id, None)
+        if future is not None:
+            future.set_result([url.strip() for url in (urls or []) if url and url.strip()])
+
+    def request(self, frame, timeout=5.0):
+        """ Returns the urls as soon as the page answers (an empty list if there are no pictures), None on timeout """
+        request_id = str(uuid.uuid4())
+        future = Future()
+        with self.lock:
+            self.pending[request_id] = future
+        try:
+            frame.ExecuteJavascript(f'''
+                (function() {{
+                    var imgs = Array.from(document.getElementsByClassName('media-box__picture-image'));
+                    window.{self.JS_FUNCTION}("{request_id}", imgs.map(img => img.src));
+                }})();
+            ''')
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            return None
+        finally:
+            with self.lock:
+                self.pending.pop(request_id, None)
+
+harvest_channel = UrlHarvestChannel()
+
+def bind_browser(browser):
+    harvest_channel.bind(browser)
+
+# Returns the src of every picture of the profile on screen, None if the browser is unavailable or nothing arrived
+# browser: cefpython3 browser object, bound with bind_browser before the page was loaded
+def harvest_image_urls(browser, timeout=5.0):
     try:
         if browser is None:
-            return "invalid"
+            return None
         frame = browser.GetMainFrame()
         if frame is None:
-            return "invalid"
-        # Use JS to get all image src URLs and write to a temp file
-        temp_id = str(uuid.uuid4())
-        temp_file = os.path.join(data_folder, f"img_urls_{temp_id}.txt")
-        js = f'''
-            (function() {{
-                var imgs = Array.from(document.getElementsByClassName('media-box__picture-image'));
-                var urls = imgs.map(img => img.src).join("\n");
-                var xhr = new XMLHttpRequest();
-                xhr.open("POST", "http://localhost:54321/save_urls_{temp_id}", true);
-                xhr.setRequestHeader('Content-Type', 'text/plain');
-                xhr.send(urls);
-            }})();
-        '''
-        # Start a simple HTTP server in a thread to receive the POST
-        import threading
-        from http.server import BaseHTTPRequestHandler, HTTPServer
-        class Handler(BaseHTTPRequestHandler):
-            def do_POST(self):
-                if self.path == f"/save_urls_{temp_id}":
-                    content_length = int(self.headers['Content-Length'])
-                    post_data = self.rfile.read(content_length)
-                    with open(temp_file, "wb") as f:
-                        f.write(post_data)
-                    self.send_response(200)
-                    self.end_headers()
-                else:
-                    self.send_response(404)
-                    self.end_headers()
-            def log_message(self, format, *args):
-                return
-        server = HTTPServer(('localhost', 54321), Handler)
-        server_thread = threading.Thread(target=server.handle_request)
-        server_thread.start()
-        frame.ExecuteJavascript(js)
-        # Wait for the file to be written
-        try:
-            for _ in range(50):  # Wait up to 5 seconds
-                if os.path.exists(temp_file):
-                    with open(temp_file, "r") as f:
-                        urls = [line.strip() for line in f if line.strip()]
-                    os.remove(temp_file)
-                    if urls:
-                        idnum = str(uuid.uuid4())
-                        savePath = os.path.join(data_folder, idnum)
-                        os.mkdir(savePath)
-                        for i, src in enumerate(urls):
-                            try:
-                                urllib.request.urlretrieve(src, os.path.join(savePath, f"image_{i}.png"))
-                            except Exception as e:
-                                print(f"Failed to download image {src}: {e}")
-                        return idnum
-                    else:
-                        return "invalid"
-                time.sleep(0.1)
-            return "invalid"
-        finally:
-            server.server_close()
-            server_thread.join(timeout=1)
+            return None
+        urls = harvest_channel.request(frame, timeout)
+        return urls if urls else None
     except Exception as e:
         print(f"[ERROR] Browser/frame destroyed or unavailable: {e}")
+        return None
+
+# MPO is how Pillow reports many camera JPEGs
+IMAGE_EXTENSIONS = {"JPEG": ".jpg", "MPO": ".jpg", "PNG": ".png", "WEBP": ".webp", "GIF": ".gif"}
+
+# File extension of a decoded picture: the table above, then Pillow's own registry, then the suffix of the url
+def image_extension(image_format, url=None):
+    if image_format in IMAGE_EXTENSIONS:
+        return IMAGE_EXTENSIONS[image_format]
+    for extension, registered_format in Image.registered_extensions().items():
+        if registered_format == image_format:
+            return extension
+    suffix = os.path.splitext(urlparse(url).path)[1].lower() if url else ""
+    return suffix or ".jpg"
+
+class DownloadedProfile:
+    """ A profile's pictures kept in memory: original encoded bytes plus the decoded RGB image """
+    def __init__(self, profile, image_names, contents, images, timings=None):
+        self.profile = profile
+        self.image_names = image_names
+        self.contents = contents
+        self.images = images
+        self.timings = timings or {}
+
+# Decodes downloaded bytes, names each picture image_{i} with the extension of its real format
+# urls: where each content came from, only used when the format has no known extension
+def decode_images(contents, urls=None):
+    image_names, kept_contents, images = [], [], []
+    for i, content in enumerate(contents):
+        if content is None:
+            continue
+        try:
+            image = Image.open(io.BytesIO(content))
+            extension = image_extension(image.format, urls[i] if urls else None)
+            image = image.convert("RGB")
+        except Exception as e:
+            print(f"Failed to decode image {i}: {e}")
+            continue
+        image_names.append(f"image_{i}{extension}")
+        kept_contents.append(content)
+        images.append(image)
+    return image_names, kept_contents, images
+
+def format_timings(timings):
+    return ", ".join(f"{stage} {seconds * 1000:.0f} ms" for stage, seconds in timings.items())
+
+# Downloads all pictures of the profile on screen into memory, labelled by a uuid. None if there are no usable pictures
+# harvest_timeout: how long to wait for the page to send the picture urls
+def download_profile(browser, harvest_timeout=5.0):
+    timings = {}
+    start = time.perf_counter()
+    urls = harvest_image_urls(browser, harvest_timeout)
+    timings["harvest"] = time.perf_counter() - start
+    if not urls:
+        print(f"[DEBUG] No pictures ({format_timings(timings)})")
+        return None
+
+    start = time.perf_counter()
+    contents = get_downloader().fetch_all(urls)
+    timings["download"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    image_names, contents, images = decode_images(contents, urls)
+    timings["decode"] = time.perf_counter() - start
+    print(f"[DEBUG] {len(images)}/{len(urls)} pictures: {format_timings(timings)}")
+    if not images:
+        return None
+    return DownloadedProfile(str(uuid.uuid4()), image_names, contents, images, timings)
+
+# Writes the original bytes of a downloaded profile into data_folder/<profile> for the Review panel
+def save_profile(downloaded, data_folder):
+    save_path = os.path.join(data_folder, downloaded.profile)
+    os.makedirs(save_path, exist_ok=True)
+    for image_name, content in zip(downloaded.image_names, downloaded.contents):
+        with open(os.path.join(save_path, image_name), "wb") as f:
+            f.write(content)
+
+_save_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="profile-save")
+
+def save_profile_async(downloaded, data_folder):
+    return _save_executor.submit(save_profile, downloaded, data_folder)
+
+# This downloads all pictures into a folder labelled by a uuid and returns the uuid, or "invalid"
+# browser: cefpython3 browser object
+# data_folder: where to save images
+def find_download_all_pictures(browser, data_folder):
+    downloaded = download_profile(browser)
+    if downloaded is None:
         return "invalid"
+    save_profile(downloaded, data_folder)
+    return downloaded.profile
 
 # Like this profile that we are working on
 def like_profile(browser):
@@ -0,0 +1,55 @@
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor
+
+# Downloads all the pictures of a profile concurrently over a shared keep-alive connection pool
+# max_workers: how many images are fetched at the same time
+# timeout: per request (connect, read) timeout in seconds
+# retries/backoff: retry transient failures (connection errors, 429 and 5xx) with exponential backoff
+
+class ImageDownloader:
+    def __init__(self, max_workers=6, timeout=(3, 10), retries=3, backoff=0.3):
+        self.timeout = timeout
+        self.session = requests.Session()
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(["GET"])
+        )
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max_workers, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="image-download")
+
+    def fetch(self, url):
+        response = self.session.get(url, timeout=self.timeout)
+        response.raise_for_status()
+        return response.content
+
+    def _fetch_or_none(self, url):
+        try:
+            return self.fetch(url)
+        except Exception as e:
+            print(f"Failed to download image {url}: {e}")
+            return None
+
+    # Returns the bytes of every url in the same order, None for the ones that failed
+    def fetch_all(self, urls):
+        return list(self.executor.map(self._fetch_or_none, urls))
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+        self.session.close()
+
+_downloader = None
+_downloader_lock = threading.Lock()
+
+def get_downloader():
+    global _downloader
+    with _downloader_lock:
+        if _downloader is None:
+            _downloader = ImageDownloader()
+        return _downloader
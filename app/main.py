@@ -4,8 +4,8 @@ import os
 import tkinter as tk
 from pathlib import Path
 from utils import utilities as UM
-import json
 import sys
+import multiprocessing
 from cefpython3 import cefpython as cef
 
 def get_executable_dir_path(relative_path=""):
@@ -33,7 +33,6 @@ BASE_DIR_EXE = get_executable_dir_path()
 
 # Use get_executable_dir_path for folders next to the EXE
 WEIGHT_FOLDER = get_executable_dir_path("weights")
-SETTINGS_PATH = get_executable_dir_path(os.path.join("configs", "settings.json"))
 
 def main():
     if not os.path.exists(WEIGHT_FOLDER):
@@ -41,14 +40,15 @@ def main():
 
     settings = UM.load_settings()
     settings["BASE_DIR"] = str(BASE_DIR_EXE)
-    with open(SETTINGS_PATH, "w") as f:
-        json.dump(settings, f, indent=4)
+    UM.save_settings(settings)
     app = Application()
     app.mainloop()
     cef.Shutdown()
 
 try:
     if __name__ == "__main__":
+        # DataLoader workers are spawned processes, the frozen exe must not rerun main() in them
+        multiprocessing.freeze_support()
         main()
 except Exception as e:
     print("\n--- UNHANDLED EXCEPTION ---")
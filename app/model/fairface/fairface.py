@@ -16,11 +16,13 @@ from PIL import Image
 import argparse
 import ast
 import sys
+import threading
 
 model_fair_7 = None
-model_fair_4 = None
 trans = None
 device = None
+face_engine = None
+model_lock = threading.Lock()
 
 # --- Your existing resource_path function ---
 def resource_path(relative_path):
@@ -35,13 +37,47 @@ def resource_path(relative_path):
 
     return os.path.join(base_path, relative_path)
 model_path_multi_7 = resource_path(os.path.join('model','fairface','fair_face_models', 'res34_fair_align_multi_7_20190809.pt'))
-model_path_multi_4 = resource_path(os.path.join('model','fairface','fair_face_models', 'res34_fair_align_multi_4_20190809.pt'))
+
+class FaceDetectionEngine:
+    """ Holds the dlib face detector and landmark predictor so they are only loaded once per process """
+    def __init__(self, predictor_path=None):
+        self.predictor_path = predictor_path or resource_path(os.path.join('model','fairface','dlib_models', 'shape_predictor_5_face_landmarks.dat'))
+        self.detector = None
+        self.shape_predictor = None
+        self.lock = threading.Lock()
+        self.reload()
+
+    def reload(self):
+        # cnn_face_detector = dlib.cnn_face_detection_model_v1(resource_path(os.path.join('model','fairface','dlib_models', 'mmod_human_face_detector.dat'))) # this is too slow
+        detector = dlib.get_frontal_face_detector() # faster model but less accurate
+        shape_predictor = dlib.shape_predictor(self.predictor_path)
+        with self.lock:
+            self.detector = detector
+            self.shape_predictor = shape_predictor
+
+    def warm_up(self, size=300):
+        # Run one detection on a blank image so the first real profile doesn't pay the first-call cost
+        self.detect(np.zeros((size, size, 3), dtype=np.uint8))
+
+    def detect(self, img, upsample=1):
+        with self.lock:
+            detector, shape_predictor = self.detector, self.shape_predictor
+        dets = detector(img, upsample)
+        # Find the 5 face landmarks we need to do the alignment.
+        faces = dlib.full_object_detections()
+        for detection in dets:
+            rect = detection.rect if hasattr(detection, "rect") else detection
+            faces.append(shape_predictor(img, rect))
+        return faces
+
+def get_face_engine():
+    global face_engine
+    if face_engine is None:
+        face_engine = FaceDetectionEngine()
+    return face_engine
 
 # Returns all the faces in iamge
 def detect_faces_of_image(image, default_max_size=800, size = 300, padding = 0.25):
-    # cnn_face_detector = dlib.cnn_face_detection_model_v1(resource_path(os.path.join('model','fairface','dlib_models', 'mmod_human_face_detector.dat'))) # this is too slow
-    cnn_face_detector = dlib.get_frontal_face_detector() # faster model but less accurate
-    sp = dlib.shape_predictor(resource_path(os.path.join('model','fairface','dlib_models', 'shape_predictor_5_face_landmarks.dat')))
     img = np.array(image)
     old_height, old_width, _ = img.shape
     if old_width > old_height:
@@ -51,104 +87,81 @@ def detect_faces_of_image(image, default_max_size=800, size = 300, padding = 0.2
         new_height = default_max_size
         new_width = int(default_max_size * old_width / old_height)
     img = dlib.resize_image(img, rows=new_height, cols=new_width)
-    dets = cnn_face_detector(img, 1)
-    num_faces = len(dets)
-    if num_faces == 0:
+    faces = get_face_engine().detect(img)
+    if len(faces) == 0:
         print("Sorry, there were no faces found")
         return np.empty(0)
-    # Find the 5 face landmarks we need to do the alignment.
-    faces = dlib.full_object_detections()
-    for detection in dets:
-        rect = detection.rect if hasattr(detection, "rect") else detection
-        faces.append(sp(img, rect))
-    # for detection in dets:
-    #     rect = detection.rect
-    #     faces.append(sp(img, rect))
     return dlib.get_face_chips(img, faces, size=size, padding = padding)
 
 def predidct_races_of_image(face_chips):
-    # list within a list. Each sublist contains scores for all races. Take max for predicted race
-    race_scores_fair = []
-    # gender_scores_fair = []
-    # age_scores_fair = []
-    race_preds_fair = []
-    # gender_preds_fair = []
-    # age_preds_fair = []
-    # race_scores_fair_4 = []
-    # race_preds_fair_4 = []
-
     # We take average if there're multiple faces
-    
-    for face_chip in face_chips:
-        pil_image = Image.fromarray(face_chip)
-        image = trans(pil_image)
-        image = image.view(1, 3, 224, 224)  # reshape image to match model dimensions (1 batch size)
-        image = image.to(device)
-
-        # fair
-        outputs = model_fair_7(image)
-        outputs = outputs.cpu().detach().numpy()
-        outputs = np.squeeze(outputs)
-
-        race_outputs = outputs[:7]
-        # gender_outputs = outputs[7:9]
-        # age_outputs = outputs[9:18]
-
-        race_score = np.exp(race_outputs) / np.sum(np.exp(race_outputs))
-        # gender_score = np.exp(gender_outputs) / np.sum(np.exp(gender_outputs))
-        # age_score = np.exp(age_outputs) / np.sum(np.exp(age_outputs))
-
-        race_pred = np.argmax(race_score)
-        # gender_pred = np.argmax(gender_score)
-        # age_pred = np.argmax(age_score)
-
-        race_scores_fair.append(race_score)
-        # gender_scores_fair.append(gender_score)
-        # age_scores_fair.append(age_score)
-
-        race_preds_fair.append(race_pred)
-        # gender_preds_fair.append(gender_pred)
-        # age_preds_fair.append(age_pred)
-        # if race_pred == 0:
-        #     print('White')
-        # elif race_pred == 1:
-        #     print("Black")
-        # elif race_pred == 2:
-        #     print("Latino_Hispanic")
-        # elif race_pred == 3:
-        #     print("East Asian")
-        # elif race_pred == 4:
-        #     print("Southeast Asian")
-        # elif race_pred == 5:
-        #     print("Indian")
-        # elif race_pred == 6:
-        #     print("Middle Eastern")    
-        # else:
-        #     print("Impossible Race")
-    if len(race_scores_fair) == 0:
-        return np.array([1/7,1/7,1/7,1/7,1/7,1/7,1/7])
-    return np.mean(np.stack(race_scores_fair), axis=0)
-
-def init_models():
-    global model_fair_7, model_fair_4, trans, device  
+    return predict_races_of_images([face_chips])[0]
+
+def predict_races_of_images(face_chips_per_image):
+    """
+    Runs model_fair_7 once over every face chip of every image of a profile.
+
+    Args:
+        face_chips_per_image (list): One list of face chips (as returned by detect_faces_of_image) per image.
+
+    Returns:
+        np.ndarray: N x 7 race scores, averaged over the faces of each image. Images without faces get a uniform score.
+    """
+    race_scores = np.full((len(face_chips_per_image), 7), 1/7, dtype=np.float32)
+    chips = []
+    owners = []
+    for image_idx, face_chips in enumerate(face_chips_per_image):
+        for face_chip in face_chips:
+            chips.append(trans(Image.fromarray(face_chip)))
+            owners.append(image_idx)
+    if len(chips) == 0:
+        return race_scores
+
+    batch = torch.stack(chips).to(device)
+    with torch.inference_mode():
+        outputs = get_model_fair_7()(batch)
+        # Only the first 7 outputs are race, 7:9 is gender and 9:18 is age
+        chip_scores = torch.softmax(outputs[:, :7].float(), dim=1).cpu().numpy()
+
+    owners = np.asarray(owners)
+    counts = np.bincount(owners, minlength=len(face_chips_per_image))
+    sums = np.zeros_like(race_scores)
+    np.add.at(sums, owners, chip_scores)
+    has_faces = counts > 0
+    race_scores[has_faces] = sums[has_faces] / counts[has_faces, None]
+    return race_scores
+
+def load_fairface_model(model_path):
+    # The checkpoint overwrites every weight, so skip downloading the ImageNet ones
+    model = torchvision.models.resnet34(weights=None)
+    model.fc = nn.Linear(model.fc.in_features, 18)
+    model.load_state_dict(torch.load(model_path, map_location=device))
+    model = model.to(device)
+    model.eval()
+    return model
+
+def get_model_fair_7():
+    global model_fair_7
+    if model_fair_7 is None:
+        with model_lock:
+            if model_fair_7 is None:
+                model_fair_7 = load_fairface_model(model_path_multi_7)
+    return model_fair_7
+
+def init_models(lazy=True):
+    global trans, device, face_engine
+    if face_engine is None:
+        face_engine = FaceDetectionEngine()
+        face_engine.warm_up()
     device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-    model_fair_7 = torchvision.models.resnet34(pretrained=True)
-    model_fair_7.fc = nn.Linear(model_fair_7.fc.in_features, 18)
-    model_fair_7.load_state_dict(torch.load(model_path_multi_7, map_location=device))
-    model_fair_7 = model_fair_7.to(device)
-    model_fair_7.eval()
-
-    model_fair_4 = torchvision.models.resnet34(pretrained=True)
-    model_fair_4.fc = nn.Linear(model_fair_4.fc.in_features, 18)
-    model_fair_4.load_state_dict(torch.load(model_path_multi_4, map_location=device))
-    model_fair_4 = model_fair_4.to(device)
-    model_fair_4.eval()
-
     trans = transforms.Compose([
         transforms.Resize((224, 224)),
         transforms.ToTensor(),
         transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
     ])
+    # model_fair_7 is loaded on first prediction unless lazy is turned off
+    if not lazy:
+        get_model_fair_7()
 
 # def convert_old_csv(csv_file, new_csv_file):
 #     image_root = "C:/Users/Redux/autolike/BumbleBot/DATA/e4fa3127d2b1b7137b65ed697015d407"
@@ -199,6 +212,9 @@ def predict(image):
     face_chips = detect_faces_of_image(image)
     return predidct_races_of_image(face_chips)
 
+def predict_batch(images):
+    return predict_races_of_images([detect_faces_of_image(image) for image in images])
+
 if __name__ == "__main__":
     init_models()
     # convert_old_csv("C:/Users/Redux/autolike/BumbleBot/DATA/e4fa3127d2b1b7137b65ed697015d407/e4fa3127d2b1b7137b65ed697015d407.csv", "C:/Users/Redux/autolike/BumbleBot/DATA/e4fa3127d2b1b7137b65ed697015d407/e4fa3127d2b1b7137b65ed697015d407_2.csv")
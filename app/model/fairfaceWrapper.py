@@ -31,4 +31,7 @@ def init_models():
     PD.init_models()
 
 def predict(image):
-    return PD.predict(image)
\ No newline at end of file
+    return PD.predict(image)
+
+def predict_batch(images):
+    return PD.predict_batch(images)
\ No newline at end of file
@@ -8,35 +8,71 @@ from model import fairfaceWrapper as FF
 from model import obeseTrainer as OT
 from torch.utils.data import DataLoader 
 from tqdm import tqdm  # For a nice progress bar
-from torch.utils.data import Dataset, random_split, DataLoader
+from torch.utils.data import Dataset, Subset, DataLoader
 from PIL import Image, ImageTk
 from torchvision.models import efficientnet_b0, EfficientNet_B0_Weights
 from torchvision import transforms
 import ast  # For safely evaluating the string representation of the list
 from utils import utilities as UM
 import csv
+import numpy as np
+import hashlib
+import json
+import time
+import contextlib
+import queue
+import threading
+
+def dataloader_options(num_workers=0, prefetch_factor=2):
+    options = {"num_workers": num_workers, "pin_memory": torch.cuda.is_available()}
+    if num_workers > 0:
+        # Keep the workers alive between epochs instead of re-spawning them (slow on Windows and in the frozen build)
+        options["persistent_workers"] = True
+        options["prefetch_factor"] = prefetch_factor
+    return options
+
+def build_full_dataset(data_index_path, user_verdicts_path, data_path, img_size, image_cache_dir=None, store=None):
+    transform = transforms.Compose([
+        transforms.Resize((img_size, img_size)),
+        transforms.ToTensor(),
+        transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
+    ])
 
-def construct_dataset(data_index_path, user_verdicts_path, data_path, img_size, batch_size, train_test_split):
+    full_dataset = ProfileImageDatasetWithMetadata(
+        init_csv_file=data_index_path,
+        user_csv_file = user_verdicts_path,
+        root_dir=data_path,
+        transform=transform,
+        index_cache_path=os.path.join(os.path.dirname(user_verdicts_path), "dataset_index.npz"),
+        user_image_dir=os.path.join(os.path.dirname(user_verdicts_path), "TRAINING"),
+        store=store
+    )
+    if image_cache_dir:
+        full_dataset.attach_image_cache(ResizedImageCache(image_cache_dir, img_size))
+    return full_dataset
+
+def split_indices(dataset, train_test_split):
+    """
+    Deterministic train/test split keyed on a hash of each image name, an image stays on the same side on every run
+    and as the data grows, so the validation set never holds rows an earlier run already trained the checkpoint on.
+    """
+    train_indices, test_indices = [], []
+    for idx in range(len(dataset)):
+        digest = hashlib.md5(dataset.cache_key(idx).encode("utf-8")).digest()
+        bucket = int.from_bytes(digest[:8], "big") / 2**64
+        (train_indices if bucket < train_test_split else test_indices).append(idx)
+    return train_indices, test_indices
+
+def construct_dataset(data_index_path, user_verdicts_path, data_path, img_size, batch_size, train_test_split, image_cache_dir=None, num_workers=0, prefetch_factor=2, store=None):
     try:
-        transform = transforms.Compose([
-            transforms.Resize((img_size, img_size)),
-            transforms.ToTensor(),
-            transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
-        ])
-
-        full_dataset = ProfileImageDatasetWithMetadata(
-            init_csv_file=data_index_path,
-            user_csv_file = user_verdicts_path,
-            root_dir=data_path,
-            transform=transform
-        )
+        full_dataset = build_full_dataset(data_index_path, user_verdicts_path, data_path, img_size, image_cache_dir, store)
 
-        train_size = int(train_test_split * len(full_dataset))
-        test_size = len(full_dataset) - train_size
-        train_dataset, test_dataset = random_split(full_dataset, [train_size, test_size])
+        train_indices, test_indices = split_indices(full_dataset, train_test_split)
+        train_dataset, test_dataset = Subset(full_dataset, train_indices), Subset(full_dataset, test_indices)
 
-        train_loader = DataLoader(train_dataset, batch_size=batch_size, shuffle=True, num_workers=0)
-        test_loader = DataLoader(test_dataset, batch_size=batch_size, shuffle=False, num_workers=0)
+        options = dataloader_options(num_workers, prefetch_factor)
+        train_loader = DataLoader(train_dataset, batch_size=batch_size, shuffle=True, **options)
+        test_loader = DataLoader(test_dataset, batch_size=batch_size, shuffle=False, **options)
 
         return train_loader, test_loader
 
@@ -47,63 +83,279 @@ def construct_dataset(data_index_path, user_verdicts_path, data_path, img_size,
         print(f"An error occurred during dataset construction: {e}")
         return None, None
 
+def construct_incremental_dataset(data_index_path, user_verdicts_path, data_path, img_size, batch_size, seen_verdicts, train_test_split, replay_ratio=2.0, image_cache_dir=None, num_workers=0, prefetch_factor=2, store=None):
+    """
+    Builds a loader over the user verdicts the current checkpoint hasn't been trained on, plus a random replay sample of
+    older rows (replay_ratio per new row) so fine-tuning on a few corrections doesn't forget everything else.
+    Both only come from the train side of split_indices, the validation rows of full runs stay unseen.
+
+    Returns:
+        DataLoader or None: None when there is nothing new to train on.
+    """
+    try:
+        full_dataset = build_full_dataset(data_index_path, user_verdicts_path, data_path, img_size, image_cache_dir, store)
+    except FileNotFoundError:
+        print(f"Error: Data index file not found at {data_index_path} or data path {data_path} is incorrect.")
+        return None
+    except Exception as e:
+        print(f"An error occurred during dataset construction: {e}")
+        return None
+
+    index = full_dataset.index
+    train_side = np.zeros(len(full_dataset), dtype=bool)
+    train_side[split_indices(full_dataset, train_test_split)[0]] = True
+    is_new = index.is_user & ~np.isin(index.image_names, list(seen_verdicts))
+    new_indices = np.flatnonzero(is_new & train_side)
+    if len(new_indices) == 0:
+        return None
+    old_indices = np.flatnonzero(~is_new & train_side)
+    replay_size = min(len(old_indices), int(np.ceil(replay_ratio * len(new_indices))))
+    replay_indices = np.random.default_rng().choice(old_indices, size=replay_size, replace=False)
+    print(f"Incremental training on {len(new_indices)} new verdicts and {replay_size} replayed rows")
+
+    subset = Subset(full_dataset, np.concatenate([new_indices, replay_indices]).tolist())
+    return DataLoader(subset, batch_size=batch_size, shuffle=True, **dataloader_options(num_workers, prefetch_factor))
+
+def seen_verdicts_path(model_path):
+    return model_path + ".verdicts.json"
+
+def load_seen_verdicts(model_path):
+    """ User verdict images the checkpoint at model_path has already been trained on """
+    path = seen_verdicts_path(model_path)
+    if not os.path.exists(path) or not os.path.exists(model_path):
+        return set()
+    try:
+        with open(path, "r") as f:
+            return set(json.load(f))
+    except Exception as e:
+        print(f"[WARN] Ignoring unreadable {path}: {e}")
+        return set()
+
+def mark_verdicts_seen(model_path, data_loader, replace=False):
+    base, indices = unwrap_subset(data_loader.dataset)
+    trained = {str(base.index.image_names[i]) for i in indices if base.index.is_user[i]}
+    seen = trained if replace else load_seen_verdicts(model_path) | trained
+    with open(seen_verdicts_path(model_path), "w") as f:
+        json.dump(sorted(seen), f)
+
 def parse_score_string(score_str):
     clean_str = score_str.strip("[]")
     clean_str = re.sub(r"[,\s]+", ",", clean_str.strip())
     final_str = "[" + clean_str + "]"
     return ast.literal_eval(final_str)
 
+def parse_score_column(values, width):
+    scores = np.zeros((len(values), width), dtype=np.float32)
+    for i, score_str in enumerate(values):
+        try:
+            scores[i] = parse_score_string(str(score_str))
+        except Exception as e:
+            print(f"[WARN] Could not parse scores {score_str!r}: {e}")
+    return scores
+
+class DatasetIndex:
+    """ Typed, contiguous view of the init labels and user verdicts so nothing is parsed per sample """
+    def __init__(self, image_names, is_user, race_scores, obesity_scores, labels):
+        self.image_names = image_names
+        self.is_user = is_user
+        self.race_scores = race_scores
+        self.obesity_scores = obesity_scores
+        self.labels = labels
+
+    def __len__(self):
+        return len(self.labels)
+
+    @staticmethod
+    def csv_signature(*csv_files):
+        signature = []
+        for csv_file in csv_files:
+            stat = os.stat(csv_file)
+            signature.extend([stat.st_mtime_ns, stat.st_size])
+        return np.array(signature, dtype=np.int64)
+
+    @classmethod
+    def from_csv(cls, init_csv_file, user_csv_file, num_race_classes=7, num_obesity_classes=3):
+        return cls.from_frames([pd.read_csv(init_csv_file), pd.read_csv(user_csv_file)], num_race_classes, num_obesity_classes)
+
+    @classmethod
+    def from_store(cls, store, num_race_classes=7, num_obesity_classes=3):
+        columns = ["image","outcome","race_scores","obese_scores"]
+        frames = [pd.DataFrame([tuple(row) for row in rows], columns=columns) for rows in (store.progress(), store.verdicts())]
+        return cls.from_frames(frames, num_race_classes, num_obesity_classes)
+
+    @classmethod
+    def from_frames(cls, frames, num_race_classes=7, num_obesity_classes=3):
+        image_names = np.concatenate([df["image"].astype(str).to_numpy() for df in frames]).astype(str)
+        is_user = np.concatenate([np.zeros(len(frames[0]), dtype=bool), np.ones(len(frames[1]), dtype=bool)])
+        race_scores = np.concatenate([parse_score_column(df["race_scores"], num_race_classes) for df in frames])
+        obesity_scores = np.concatenate([parse_score_column(df["obese_scores"], num_obesity_classes) for df in frames])
+        labels = np.concatenate([df["outcome"].to_numpy(dtype=np.float32) for df in frames])
+        return cls(image_names, is_user, race_scores, obesity_scores, labels)
+
+    @classmethod
+    def load(cls, init_csv_file, user_csv_file, cache_path=None, num_race_classes=7, num_obesity_classes=3, store=None):
+        """ store: ProfileStore to read the labels from instead of the CSV files """
+        if store is not None:
+            signature = np.array(store.signature(), dtype=np.int64)
+        else:
+            signature = cls.csv_signature(init_csv_file, user_csv_file)
+        if cache_path and os.path.exists(cache_path):
+            try:
+                with np.load(cache_path) as data:
+                    if np.array_equal(data["signature"], signature):
+                        return cls(data["image_names"], data["is_user"], data["race_scores"], data["obesity_scores"], data["labels"])
+            except Exception as e:
+                print(f"[WARN] Ignoring unreadable dataset index {cache_path}: {e}")
+
+        if store is not None:
+            index = cls.from_store(store, num_race_classes, num_obesity_classes)
+        else:
+            index = cls.from_csv(init_csv_file, user_csv_file, num_race_classes, num_obesity_classes)
+        if cache_path:
+            try:
+                tmp_path = cache_path + ".tmp.npz"
+                np.savez(tmp_path, signature=signature, image_names=index.image_names, is_user=index.is_user,
+                         race_scores=index.race_scores, obesity_scores=index.obesity_scores, labels=index.labels)
+                os.replace(tmp_path, cache_path)
+            except Exception as e:
+                print(f"[WARN] Could not write dataset index {cache_path}: {e}")
+        return index
+
 class ProfileImageDatasetWithMetadata(Dataset):
-    def __init__(self, init_csv_file, user_csv_file, root_dir, transform=None, num_race_classes=7, num_obesity_classes=3):
-        self.df1 = pd.read_csv(init_csv_file)
-        if not os.path.exists(user_csv_file):
+    def __init__(self, init_csv_file, user_csv_file, root_dir, transform=None, num_race_classes=7, num_obesity_classes=3, index_cache_path=None, user_image_dir=None, store=None):
+        if store is None and not os.path.exists(user_csv_file):
             with open(user_csv_file, "w", newline="") as file:
                 writer = csv.writer(file)
                 writer.writerow(["image","outcome","race_scores","obese_scores"])
                 file.flush()
-        self.df2 = pd.read_csv(user_csv_file)
+        self.index = DatasetIndex.load(init_csv_file, user_csv_file, index_cache_path, num_race_classes, num_obesity_classes, store)
         self.root_dir = root_dir
+        if user_image_dir is None:
+            settings = UM.load_settings()
+            user_image_dir = os.path.join(settings["BASE_DIR"],settings["PROFILEPATH"],"TRAINING")
+        self.user_image_dir = user_image_dir
         self.transform = transform
+        self.image_cache = None
+        self.cached_transform = transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
         self.num_race_classes = num_race_classes
         self.num_obesity_classes = num_obesity_classes
-        
-        self.len1 = len(self.df1)
-        self.len2 = len(self.df2)
+
+        self.len1 = int(np.count_nonzero(~self.index.is_user))
+        self.len2 = int(np.count_nonzero(self.index.is_user))
 
     def __len__(self):
-        return self.len1 + self.len2
+        return len(self.index)
 
     def __getitem__(self, idx):
-        if idx < self.len1:
-            row = self.df1.iloc[idx]
-            return self.process_row(row, source="init")
+        if self.image_cache is not None:
+            # Already decoded and resized, only scale and normalize
+            image = torch.from_numpy(self.image_cache.read(self.cache_key(idx))).permute(2, 0, 1).float().div_(255)
+            image = self.cached_transform(image)
         else:
-            row = self.df2.iloc[idx - self.len1]
-            return self.process_row(row, source="user")
-        
-    def process_row(self, row, source="init"):
-        image_name = row['image']
-        label = float(row['outcome'])
-        race_scores = parse_score_string(row['race_scores'])
-        obesity_scores = parse_score_string(row['obese_scores'])
+            try:
+                image = Image.open(self.get_image_path(idx)).convert('RGB')
+            except:
+                image = Image.new("RGB", (224, 224))
 
-        image_path = os.path.join(self.root_dir, image_name)
+            if self.transform:
+                image = self.transform(image)
+
+        race_tensor, obesity_tensor, label_tensor = self.get_metadata(idx)
+        return image, race_tensor, obesity_tensor, label_tensor
+
+    def cache_key(self, idx):
+        return ("user/" if self.index.is_user[idx] else "init/") + str(self.index.image_names[idx])
+
+    def attach_image_cache(self, image_cache):
+        image_cache.build([(self.cache_key(idx), self.get_image_path(idx)) for idx in range(len(self))])
+        self.image_cache = image_cache
+
+    def get_image_path(self, idx):
+        return self.image_path_of(self.index.image_names[idx], "user" if self.index.is_user[idx] else "init")
+
+    def get_metadata(self, idx):
+        race_tensor = torch.from_numpy(self.index.race_scores[idx])
+        obesity_tensor = torch.from_numpy(self.index.obesity_scores[idx])
+        label_tensor = torch.tensor(self.index.labels[idx], dtype=torch.float32)
+        return race_tensor, obesity_tensor, label_tensor
+
+    def image_path_of(self, image_name, source="init"):
         if source == "user":
-            settings = UM.load_settings()
-            image_path = os.path.join(settings["BASE_DIR"],settings["PROFILEPATH"],"TRAINING",image_name)
+            return os.path.join(self.user_image_dir, image_name)
+        return os.path.join(self.root_dir, image_name)
+
+class ResizedImageCache:
+    """
+    All training images decoded and resized once into a memory-mapped uint8 (N x H x W x 3) .npy file.
+    The json index maps each image key to its row and the source file mtime, changed or new images are the only ones decoded again.
+    """
+    def __init__(self, cache_dir, img_size):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.img_size = img_size
+        self.data_path = os.path.join(cache_dir, f"images_{img_size}.npy")
+        self.index_path = os.path.join(cache_dir, f"images_{img_size}_index.json")
+        self.rows = {}
+        self.data = None
+
+    def load_index(self):
+        if not os.path.exists(self.index_path) or not os.path.exists(self.data_path):
+            return {}
+        try:
+            with open(self.index_path, "r") as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"[WARN] Ignoring unreadable image cache index {self.index_path}: {e}")
+            return {}
+
+    def decode(self, image_path):
         try:
             image = Image.open(image_path).convert('RGB')
         except:
             image = Image.new("RGB", (224, 224))
-
-        if self.transform:
-            image = self.transform(image)
-
-        race_tensor = torch.tensor(race_scores, dtype=torch.float32)
-        obesity_tensor = torch.tensor(obesity_scores, dtype=torch.float32)
-        label_tensor = torch.tensor(label, dtype=torch.float32)
-
-        return image, race_tensor, obesity_tensor, label_tensor
+        return np.asarray(image.resize((self.img_size, self.img_size), Image.BILINEAR), dtype=np.uint8)
+
+    def build(self, items):
+        """ items: list of (key, image path) """
+        old_index = self.load_index()
+        entries = {}
+        for key, image_path in items:
+            entries[key] = os.stat(image_path).st_mtime_ns if os.path.exists(image_path) else -1
+
+        reusable = {key for key, mtime in entries.items() if key in old_index and old_index[key][1] == mtime}
+        if len(reusable) == len(entries) == len(old_index):
+            self.rows = {key: row for key, (row, _) in old_index.items()}
+            self.data = np.load(self.data_path, mmap_mode="c")
+            return
+
+        old_data = np.load(self.data_path, mmap_mode="r") if reusable else None
+        tmp_path = self.data_path + ".tmp"
+        new_data = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.uint8, shape=(len(items), self.img_size, self.img_size, 3))
+        new_index = {}
+        for row, (key, image_path) in enumerate(tqdm(items, desc="Caching resized images", leave=False)):
+            if key in reusable:
+                new_data[row] = old_data[old_index[key][0]]
+            else:
+                new_data[row] = self.decode(image_path)
+            new_index[key] = [row, entries[key]]
+        new_data.flush()
+        del new_data, old_data
+
+        os.replace(tmp_path, self.data_path)
+        with open(self.index_path, "w") as f:
+            json.dump(new_index, f)
+        self.rows = {key: row for key, (row, _) in new_index.items()}
+        self.data = np.load(self.data_path, mmap_mode="c")
+
+    def __getstate__(self):
+        # Worker processes re-open the mmap themselves instead of receiving a pickled copy of the whole array
+        state = self.__dict__.copy()
+        state["data"] = None
+        return state
+
+    def read(self, key):
+        if self.data is None:
+            self.data = np.load(self.data_path, mmap_mode="c")
+        return self.data[self.rows[key]]
 
 class InterestRegressorWithMetadata(nn.Module):
     def __init__(self, img_size, num_race_classes=7, num_obesity_classes=3, pretrained=True, freeze_features=False):
@@ -121,67 +373,442 @@ class InterestRegressorWithMetadata(nn.Module):
             nn.Tanh()
         )
 
-    def forward(self, image, race_tensor, obesity_tensor):
+    def embed(self, image):
+        # 1280-d pooled EfficientNet-B0 features
         x = self.efficientnet.features(image)
         x = self.efficientnet.avgpool(x)
-        x = torch.flatten(x, 1)
-        combined = torch.cat((x, race_tensor, obesity_tensor), dim=1)
+        return torch.flatten(x, 1)
+
+    def head(self, embedding, race_tensor, obesity_tensor):
+        combined = torch.cat((embedding, race_tensor, obesity_tensor), dim=1)
         return self.fc(combined)
 
-def train_classifier_with_metadata(train_loader, num_epochs, image_size, model_path, num_race_classes=7, num_obesity_classes=3, cancel_flag=None, progress_callback=None):
-    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-    model = InterestRegressorWithMetadata(img_size=image_size, num_race_classes=num_race_classes, num_obesity_classes=num_obesity_classes)
+    def forward(self, image, race_tensor, obesity_tensor):
+        return self.head(self.embed(image), race_tensor, obesity_tensor)
+
+def file_content_hash(path):
+    try:
+        with open(path, "rb") as f:
+            return hashlib.sha1(f.read()).hexdigest()
+    except OSError:
+        return None
+
+def backbone_fingerprint(model, img_size):
+    # Cached embeddings are only valid for the exact backbone weights and input size they were computed with
+    digest = hashlib.sha1(str(img_size).encode())
+    for name, tensor in model.efficientnet.features.state_dict().items():
+        digest.update(name.encode())
+        digest.update(tensor.detach().cpu().contiguous().numpy().tobytes())
+    return digest.hexdigest()
+
+class EmbeddingCache:
+    """ On-disk cache of backbone embeddings keyed by image content hash """
+    def __init__(self, cache_path, fingerprint):
+        self.cache_path = cache_path
+        self.fingerprint = fingerprint
+        self.embeddings = {}
+        self.dirty = False
+        if cache_path and os.path.exists(cache_path):
+            try:
+                with np.load(cache_path) as data:
+                    if str(data["fingerprint"]) == fingerprint:
+                        self.embeddings = dict(zip(data["keys"].tolist(), data["embeddings"]))
+            except Exception as e:
+                print(f"[WARN] Ignoring unreadable embedding cache {cache_path}: {e}")
+
+    def get(self, key):
+        return self.embeddings.get(key) if key else None
+
+    def put(self, key, embedding):
+        if key:
+            self.embeddings[key] = embedding
+            self.dirty = True
+
+    def save(self):
+        if not self.cache_path or not self.dirty:
+            return
+        keys = list(self.embeddings.keys())
+        embeddings = np.stack([self.embeddings[k] for k in keys]).astype(np.float32) if keys else np.zeros((0, 0), dtype=np.float32)
+        tmp_path = self.cache_path + ".tmp.npz"
+        np.savez(tmp_path, fingerprint=self.fingerprint, keys=np.array(keys), embeddings=embeddings)
+        os.replace(tmp_path, self.cache_path)
+        self.dirty = False
+
+def unwrap_subset(dataset):
+    # construct_dataset hands back Subsets, the embedding cache needs the underlying dataset and indices
+    indices = list(range(len(dataset)))
+    while isinstance(dataset, Subset):
+        indices = [dataset.indices[i] for i in indices]
+        dataset = dataset.dataset
+    return dataset, indices
+
+def compute_cached_embeddings(model, dataset, cache_path, img_size, device, batch_size=32, cancel_flag=None):
+    """
+    Pushes every image of the dataset through the frozen backbone once, reusing embeddings already in the cache.
+
+    Returns:
+        tuple: (N x 1280 embeddings, N x 7 race, N x 3 obesity, N labels) tensors, or None if cancelled.
+    """
+    base, indices = unwrap_subset(dataset)
+    cache = EmbeddingCache(cache_path, backbone_fingerprint(model, img_size))
+    embeddings = [None] * len(indices)
+    races, obesities, labels = [], [], []
+    misses = []
+    for pos, idx in enumerate(indices):
+        race_tensor, obesity_tensor, label_tensor = base.get_metadata(idx)
+        races.append(race_tensor)
+        obesities.append(obesity_tensor)
+        labels.append(label_tensor)
+        key = file_content_hash(base.get_image_path(idx))
+        cached = cache.get(key)
+        if cached is not None:
+            embeddings[pos] = torch.from_numpy(np.asarray(cached, dtype=np.float32))
+        else:
+            misses.append((pos, idx, key))
 
+    model.eval()
+    for start in tqdm(range(0, len(misses), batch_size), desc="Caching embeddings", leave=False):
+        if cancel_flag and cancel_flag():
+            cache.save()
+            return None
+        chunk = misses[start:start + batch_size]
+        images = torch.stack([base[idx][0] for _, idx, _ in chunk]).to(device)
+        with torch.inference_mode():
+            batch_embeddings = model.embed(images).float().cpu()
+        for (pos, _, key), embedding in zip(chunk, batch_embeddings):
+            embeddings[pos] = embedding
+            cache.put(key, embedding.numpy())
+    cache.save()
+    print(f"Embedding cache: {len(indices) - len(misses)} hits, {len(misses)} computed")
+
+    return torch.stack(embeddings), torch.stack(races), torch.stack(obesities), torch.stack(labels)
+
+def save_checkpoint(state_dict, model_path):
+    # Write next to the model and rename over it, a cancelled or crashed write never leaves a corrupt .h5 behind
+    tmp_path = model_path + ".tmp"
+    torch.save(state_dict, tmp_path)
+    os.replace(tmp_path, model_path)
+
+class CheckpointWriter:
+    """ Saves model checkpoints on a background thread, only the most recent pending snapshot is kept """
+    def __init__(self, model_path):
+        self.model_path = model_path
+        self.saved = False  # a snapshot was handed over during this run
+        self.pending = queue.Queue(maxsize=1)
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def save(self, model):
+        # Snapshot synchronously so training can keep updating the weights while the copy is written
+        state = {k: v.detach().to("cpu", copy=True) for k, v in model.state_dict().items()}
+        try:
+            self.pending.get_nowait()  # an older snapshot that wasn't written yet is superseded
+        except queue.Empty:
+            pass
+        self.pending.put(state)
+        self.saved = True
+
+    def run(self):
+        while True:
+            state = self.pending.get()
+            if state is None:
+                return
+            try:
+                save_checkpoint(state, self.model_path)
+            except Exception as e:
+                print(f"Failed to save checkpoint to {self.model_path}: {e}")
+
+    def close(self):
+        self.pending.put(None)
+        self.thread.join()
+
+class EarlyStopping:
+    """ Tracks the best validation loss and stops once it hasn't improved for `patience` epochs (never if patience is None) """
+    def __init__(self, patience=None, min_delta=0.0):
+        self.patience = patience
+        self.min_delta = min_delta
+        self.best_loss = None
+        self.best_epoch = None
+        self.best_state = None
+        self.bad_epochs = 0
+
+    def step(self, val_loss, model, epoch):
+        if self.best_loss is None or val_loss < self.best_loss - self.min_delta:
+            self.best_loss = val_loss
+            self.best_epoch = epoch
+            self.best_state = {k: v.detach().cpu().clone() for k, v in model.state_dict().items()}
+            self.bad_epochs = 0
+            return True
+        self.bad_epochs += 1
+        return False
+
+    @property
+    def should_stop(self):
+        return self.patience is not None and self.bad_epochs >= self.patience
+
+    def restore(self, model):
+        if self.best_state is not None:
+            model.load_state_dict(self.best_state)
+
+    @property
+    def kept_baseline(self):
+        # Nothing beat the loss of the loaded checkpoint (stepped as epoch 0)
+        return self.best_epoch == 0
+
+def evaluate(model, data_loader, device, mixed_precision=False):
+    """ Mean squared error of the model over a data loader """
+    model.eval()
+    total_loss = 0.0
+    total_samples = 0
+    with torch.inference_mode():
+        for images, race_tensor, obesity_tensor, labels in data_loader:
+            images = images.to(device, non_blocking=True)
+            race_tensor = race_tensor.to(device, non_blocking=True)
+            obesity_tensor = obesity_tensor.to(device, non_blocking=True)
+            labels = labels.to(device, non_blocking=True).unsqueeze(1)
+            with autocast_context(device, mixed_precision):
+                outputs = model(images, race_tensor, obesity_tensor)
+            total_loss += nn.functional.mse_loss(outputs.float(), labels, reduction="sum").item()
+            total_samples += images.size(0)
+    return total_loss / max(total_samples, 1)
+
+def load_training_model(model_path, image_size, num_race_classes, num_obesity_classes, device):
+    """ Builds the regressor on device and resumes it from model_path if there is a checkpoint. Returns (model, loaded) """
+    model = InterestRegressorWithMetadata(img_size=image_size, num_race_classes=num_race_classes, num_obesity_classes=num_obesity_classes)
+    loaded = False
     if os.path.exists(model_path) and os.path.getsize(model_path) > 0:
         try:
             model.load_state_dict(torch.load(model_path, map_location=device))
+            loaded = True
             print("Loaded model from", model_path)
         except Exception as e:
             print(f"Failed to load model from {model_path}: {e}")
+    return model.to(device), loaded
+
+def start_early_stopping(model, loaded, patience, validation_loss=None):
+    """
+    EarlyStopping for a training run. With a loaded checkpoint and validation data, validation_loss() of the loaded model
+    is stepped as epoch 0: it is the loss to beat, and a run that never improves on it doesn't replace the checkpoint.
+    """
+    stopper = EarlyStopping(patience)
+    if loaded and validation_loss is not None:
+        baseline_loss = validation_loss()
+        stopper.step(baseline_loss, model, 0)
+        print(f"Loaded model Val Loss: {baseline_loss:.4f}")
+    return stopper
+
+def has_samples(data_loader):
+    return data_loader is not None and len(data_loader.dataset) > 0
+
+def train_head_with_cached_embeddings(train_loader, num_epochs, image_size, model_path, embedding_cache_path, num_race_classes=7, num_obesity_classes=3, cancel_flag=None, progress_callback=None, val_loader=None, patience=None):
+    """
+    Trains only the fc head on cached backbone embeddings, the EfficientNet features stay frozen.
+    Each epoch runs on in-memory 1280-d vectors instead of images, so it takes milliseconds instead of minutes.
+
+    Returns:
+        bool: whether a checkpoint was written to model_path
+    """
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    model, loaded = load_training_model(model_path, image_size, num_race_classes, num_obesity_classes, device)
+    for param in model.efficientnet.parameters():
+        param.requires_grad = False
+
+    cached = compute_cached_embeddings(model, train_loader.dataset, embedding_cache_path, image_size, device, cancel_flag=cancel_flag)
+    if cached is None:
+        print("Training cancelled.")
+        return False
+    embeddings, race_tensor, obesity_tensor, labels = (t.to(device) for t in cached)
+    labels = labels.unsqueeze(1)
+    num_samples = embeddings.size(0)
+    batch_size = train_loader.batch_size or num_samples
+
+    val_cached = None
+    if has_samples(val_loader):
+        val_cached = compute_cached_embeddings(model, val_loader.dataset, embedding_cache_path, image_size, device, cancel_flag=cancel_flag)
+        if val_cached is None:
+            print("Training cancelled.")
+            return False
+        val_embeddings, val_race, val_obesity, val_labels = (t.to(device) for t in val_cached)
+        val_labels = val_labels.unsqueeze(1)
 
-    model.to(device)
     criterion = nn.MSELoss()
-    optimizer = optim.Adam(model.parameters(), lr=1e-4)
+
+    def validation_loss():
+        model.fc.eval()
+        with torch.inference_mode():
+            return criterion(model.head(val_embeddings, val_race, val_obesity), val_labels).item()
+
+    stopper = start_early_stopping(model, loaded, patience, validation_loss if val_cached is not None else None)
+    optimizer = optim.Adam(model.fc.parameters(), lr=1e-4)
 
     for epoch in range(num_epochs):
         if cancel_flag and cancel_flag():
             print("Training cancelled.")
-            break
+            return False
         if progress_callback:
             progress_callback(epoch + 1)
-        model.train()
+        model.fc.train()
         running_loss = 0.0
-        train_loader_iter = tqdm(train_loader, desc=f"Epoch {epoch+1}/{num_epochs}", leave=False)
-
-        for images, race_tensor, obesity_tensor, labels in train_loader_iter:
-            if cancel_flag and cancel_flag():
-                print("Training cancelled.")
-                break
-            images = images.to(device)
-            race_tensor = race_tensor.to(device)
-            obesity_tensor = obesity_tensor.to(device)
-            labels = labels.to(device).unsqueeze(1)
-
+        permutation = torch.randperm(num_samples, device=device)
+        for start in range(0, num_samples, batch_size):
+            batch_idx = permutation[start:start + batch_size]
             optimizer.zero_grad()
-            outputs = model(images, race_tensor, obesity_tensor)
-            loss = criterion(outputs, labels)
+            outputs = model.head(embeddings[batch_idx], race_tensor[batch_idx], obesity_tensor[batch_idx])
+            loss = criterion(outputs, labels[batch_idx])
             loss.backward()
             optimizer.step()
+            running_loss += loss.item() * batch_idx.size(0)
+
+        epoch_loss = running_loss / max(num_samples, 1)
+        if val_cached is None:
+            print(f"Epoch {epoch+1}, Loss: {epoch_loss:.4f}")
+            continue
+        val_loss = validation_loss()
+        stopper.step(val_loss, model, epoch + 1)
+        print(f"Epoch {epoch+1}, Loss: {epoch_loss:.4f}, Val Loss: {val_loss:.4f}")
+        if stopper.should_stop:
+            print(f"Early stopping, best validation loss {stopper.best_loss:.4f} at epoch {stopper.best_epoch}")
+            break
+
+    stopper.restore(model)
+    if stopper.kept_baseline:
+        print(f"No improvement over the loaded model, {model_path} left unchanged")
+        return False
+    save_checkpoint(model.state_dict(), model_path)
+    print(f"Model saved to {model_path}")
+    return True
+
+def autocast_context(device, enabled):
+    # AMP (fp16) on CUDA, bf16 on CPU
+    if not enabled:
+        return contextlib.nullcontext()
+    if device.type == "cuda":
+        return torch.autocast("cuda", dtype=torch.float16)
+    return torch.autocast("cpu", dtype=torch.bfloat16)
+
+def benchmark_training_step(model, batch, device, mixed_precision, steps=3):
+    """ Median seconds of a forward/backward pass on one batch, the first (warm-up/compile) step is not counted """
+    criterion = nn.MSELoss()
+    images, race_tensor, obesity_tensor, labels = (t.to(device) for t in batch)
+    labels = labels.unsqueeze(1)
+    was_training = model.training
+    model.eval()  # keep BatchNorm running stats untouched
+    timings = []
+    for step in range(steps + 1):
+        if device.type == "cuda":
+            torch.cuda.synchronize()
+        start = time.perf_counter()
+        with autocast_context(device, mixed_precision):
+            outputs = model(images, race_tensor, obesity_tensor)
+        loss = criterion(outputs.float(), labels)
+        loss.backward()
+        if device.type == "cuda":
+            torch.cuda.synchronize()
+        if step > 0:
+            timings.append(time.perf_counter() - start)
+        model.zero_grad(set_to_none=True)
+    model.train(was_training)
+    return float(np.median(timings))
+
+def train_classifier_with_metadata(train_loader, num_epochs, image_size, model_path, num_race_classes=7, num_obesity_classes=3, cancel_flag=None, progress_callback=None, head_only=False, embedding_cache_path=None, mixed_precision=False, compile_model=False, status_callback=None, val_loader=None, patience=None, checkpoint_every=1, save_best_only=True):
+    """ Returns whether a checkpoint was written to model_path, callers only record what the checkpoint has seen if it was """
+    if head_only:
+        return train_head_with_cached_embeddings(train_loader, num_epochs, image_size, model_path, embedding_cache_path, num_race_classes, num_obesity_classes, cancel_flag, progress_callback, val_loader, patience)
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    model, loaded = load_training_model(model_path, image_size, num_race_classes, num_obesity_classes, device)
+    # train_model shares its parameters with model, checkpoints are always taken from the uncompiled model
+    train_model = model
+    if compile_model and hasattr(torch, "compile"):
+        try:
+            train_model = torch.compile(model)
+        except Exception as e:
+            print(f"torch.compile unavailable, training uncompiled: {e}")
 
-            running_loss += loss.item() * images.size(0)
+    if (mixed_precision or train_model is not model) and len(train_loader) > 0:
+        try:
+            batch = next(iter(train_loader))
+            baseline = benchmark_training_step(model, batch, device, mixed_precision=False)
+            fast = benchmark_training_step(train_model, batch, device, mixed_precision=mixed_precision)
+            message = f"Fast training: {baseline / fast:.2f}x faster than fp32 ({fast * 1000:.0f} ms vs {baseline * 1000:.0f} ms per batch)"
+            print(message)
+            if status_callback:
+                status_callback(message)
+        except Exception as e:
+            print(f"Falling back to fp32 training: {e}")
+            train_model = model
+            mixed_precision = False
 
-        epoch_loss = running_loss / len(train_loader.dataset)
-        print(f"Epoch {epoch+1}, Loss: {epoch_loss:.4f}")
-        if cancel_flag and cancel_flag():
-            return model
-        torch.save(model.state_dict(), model_path)
-        # print(f"Model saved to {model_path}")
+    validate = has_samples(val_loader)
+    stopper = start_early_stopping(model, loaded, patience, (lambda: evaluate(model, val_loader, device)) if validate else None)
+    checkpoint_every = max(1, int(checkpoint_every))
+    criterion = nn.MSELoss()
+    optimizer = optim.Adam(model.parameters(), lr=1e-4)
+    scaler = torch.cuda.amp.GradScaler(enabled=mixed_precision and device.type == "cuda")
+
+    checkpoints = CheckpointWriter(model_path)
+    try:
+        for epoch in range(num_epochs):
+            if cancel_flag and cancel_flag():
+                print("Training cancelled.")
+                break
+            if progress_callback:
+                progress_callback(epoch + 1)
+            train_model.train()
+            running_loss = 0.0
+            train_loader_iter = tqdm(train_loader, desc=f"Epoch {epoch+1}/{num_epochs}", leave=False)
+
+            for images, race_tensor, obesity_tensor, labels in train_loader_iter:
+                if cancel_flag and cancel_flag():
+                    print("Training cancelled.")
+                    break
+                images = images.to(device, non_blocking=True)
+                race_tensor = race_tensor.to(device, non_blocking=True)
+                obesity_tensor = obesity_tensor.to(device, non_blocking=True)
+                labels = labels.to(device, non_blocking=True).unsqueeze(1)
+
+                optimizer.zero_grad()
+                with autocast_context(device, mixed_precision):
+                    outputs = train_model(images, race_tensor, obesity_tensor)
+                loss = criterion(outputs.float(), labels)
+                scaler.scale(loss).backward()
+                scaler.step(optimizer)
+                scaler.update()
+
+                running_loss += loss.item() * images.size(0)
+
+            epoch_loss = running_loss / len(train_loader.dataset)
+            if cancel_flag and cancel_flag():
+                print(f"Epoch {epoch+1}, Loss: {epoch_loss:.4f}")
+                return checkpoints.saved
+            if not validate:
+                print(f"Epoch {epoch+1}, Loss: {epoch_loss:.4f}")
+                if (epoch + 1) % checkpoint_every == 0:
+                    checkpoints.save(model)
+                continue
+
+            val_loss = evaluate(train_model, val_loader, device, mixed_precision)
+            print(f"Epoch {epoch+1}, Loss: {epoch_loss:.4f}, Val Loss: {val_loss:.4f}")
+            improved = stopper.step(val_loss, model, epoch + 1)
+            # Periodic snapshots only start once the loaded checkpoint has been beaten, until then it stays on disk
+            periodic = not save_best_only and (epoch + 1) % checkpoint_every == 0 and not stopper.kept_baseline
+            if (improved and save_best_only) or periodic:
+                checkpoints.save(model)
+            if stopper.should_stop:
+                print(f"Early stopping, best validation loss {stopper.best_loss:.4f} at epoch {stopper.best_epoch}")
+                break
         
-    if cancel_flag and cancel_flag():
-        return model
-    torch.save(model.state_dict(), model_path)
-    print(f"Model saved to {model_path}")
-    return model
+        if cancel_flag and cancel_flag():
+            return checkpoints.saved
+        stopper.restore(model)
+        if stopper.kept_baseline:
+            print(f"No improvement over the loaded model, {model_path} left unchanged")
+            return checkpoints.saved
+        checkpoints.save(model)
+        print(f"Model saved to {model_path}")
+        return checkpoints.saved
+    finally:
+        # Waits for the last pending checkpoint to hit the disk
+        checkpoints.close()
 
 def predict(model, data_loader):
     device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
@@ -202,70 +829,128 @@ def predict(model, data_loader):
             obesity_list.extend(obesity_onehot.tolist())
     return all_predictions, race_list, obesity_list
 
+def predict_profile(model, profile_batch, channels_last=False):
+    """
+    Scores every photo of a profile in a single forward pass.
+
+    Args:
+        model (InterestRegressorWithMetadata): Model in eval mode.
+        profile_batch (ProfileBatch): Output of load_profile_batch/build_profile_batch.
+        channels_last (bool): Feed the images in channels_last memory format, the model should be converted too.
+
+    Returns:
+        np.ndarray: One predicted attractiveness score per photo.
+    """
+    if len(profile_batch) == 0:
+        return np.zeros(0, dtype=np.float32)
+    device = next(model.parameters()).device
+    images = profile_batch.images.to(device)
+    if channels_last:
+        images = images.contiguous(memory_format=torch.channels_last)
+    race_tensor = torch.as_tensor(profile_batch.race_scores, dtype=torch.float32, device=device)
+    obesity_tensor = torch.as_tensor(profile_batch.obesity_scores, dtype=torch.float32, device=device)
+    model.eval()
+    with torch.inference_mode():
+        outputs = model(images, race_tensor, obesity_tensor)
+    return outputs.float().cpu().numpy().flatten()
+
 class SingleImageDataset(Dataset):
-    def __init__(self, image_paths, race_vectors, obesity_vectors, img_size, transform=None):
-        self.image_paths = image_paths
-        self.race_vectors = race_vectors
-        self.obesity_vectors = obesity_vectors
-        self.img_size = img_size
-        self.transform = transform
+    def __init__(self, images, race_vectors, obesity_vectors):
+        # images is an already transformed N x 3 x H x W tensor, so nothing is read from disk here
+        self.images = images
+        self.race_vectors = torch.as_tensor(race_vectors, dtype=torch.float32)
+        self.obesity_vectors = torch.as_tensor(obesity_vectors, dtype=torch.float32)
 
     def __len__(self):
-        return len(self.image_paths)
+        return len(self.images)
 
     def __getitem__(self, idx):
-        img_path = self.image_paths[idx]
-        try:
-            image = Image.open(img_path).convert('RGB')
-            if self.transform:
-                image = self.transform(image)
+        dummy_label = torch.tensor(0.0, dtype=torch.float32)
+        return self.images[idx], self.race_vectors[idx], self.obesity_vectors[idx], dummy_label
 
-            race_onehot = torch.tensor(self.race_vectors[idx], dtype=torch.float32)
-            obesity_onehot = torch.tensor(self.obesity_vectors[idx], dtype=torch.float32)
-            dummy_label = torch.tensor(0.0, dtype=torch.float32)
+class ProfileBatch:
+    """ Every photo of a profile decoded once and scored by FairFace and the obesity model, ready for the interest regressor """
+    def __init__(self, image_names, images, race_scores, obesity_scores):
+        self.image_names = image_names
+        self.images = images
+        self.race_scores = race_scores
+        self.obesity_scores = obesity_scores
 
-            return image, race_onehot, obesity_onehot, dummy_label
-        except Exception as e:
-            print(f"Error loading image at {img_path}: {e}")
-            placeholder = torch.zeros((3, self.img_size, self.img_size))
-            return placeholder, torch.zeros(7), torch.zeros(3), torch.tensor(0.0)
+    def __len__(self):
+        return len(self.image_names)
+
+prediction_transforms = {}
+
+def get_prediction_transform(img_size):
+    if img_size not in prediction_transforms:
+        prediction_transforms[img_size] = transforms.Compose([
+            transforms.Resize((img_size, img_size)),
+            transforms.ToTensor(),
+            transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
+        ])
+    return prediction_transforms[img_size]
 
 def init_models():
     FF.init_models()
     OT.init_models()
 
-def load_images_for_prediction_dataloader(data_path, img_size, profile, batch_size=1):
-    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-    picture_dir = os.path.join(data_path, profile)
-    image_paths = [os.path.join(picture_dir, f) for f in sorted(os.listdir(picture_dir)) if os.path.isfile(os.path.join(picture_dir, f))]
+def build_profile_batch(image_names, images, img_size, profile=""):
+    """
+    Fans already decoded images out to FairFace, the obesity model and the interest regressor transform.
+
+    Args:
+        image_names (list[str]): Name of each image, used for logging.
+        images (list[PIL.Image | None]): Decoded RGB images, None for images that failed to decode.
+        img_size (int): Input size of the interest regressor.
+
+    Returns:
+        ProfileBatch: Image tensor (N x 3 x img_size x img_size) with N x 7 race and N x 3 obesity scores.
+    """
+    transform = get_prediction_transform(img_size)
+    race_scores = np.zeros((len(images), 7), dtype=np.float32)
+    obesity_scores = np.zeros((len(images), 3), dtype=np.float32)
+    tensors = torch.zeros((len(images), 3, img_size, img_size))
+
+    loaded_idx = [idx for idx, image in enumerate(images) if image is not None]
+    loaded_images = [images[idx] for idx in loaded_idx]
+    if loaded_images:
+        # All face chips of the profile go through FairFace in a single forward pass
+        try:
+            race_scores[loaded_idx] = FF.predict_batch(loaded_images)
+        except Exception as e:
+            print(f"[WARN] Race prediction failed for profile {profile}: {e}")
+        try:
+            obesity_scores[loaded_idx] = OT.predict_obesity_batch(loaded_images)
+        except Exception as e:
+            print(f"[WARN] Obesity prediction failed for profile {profile}: {e}")
+        for idx, image in zip(loaded_idx, loaded_images):
+            try:
+                tensors[idx] = transform(image)
+            except Exception as e:
+                print(f"[WARN] Skipping {image_names[idx]} due to error: {e}")
 
-    transform = transforms.Compose([
-        transforms.Resize((img_size, img_size)),
-        transforms.ToTensor(),
-        transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
-    ])
+    return ProfileBatch(image_names, tensors, race_scores, obesity_scores)
 
-    race_scores = []
-    obesity_scores = []
+def load_profile_batch(data_path, img_size, profile):
+    picture_dir = os.path.join(data_path, profile)
+    image_names = [f for f in sorted(os.listdir(picture_dir)) if os.path.isfile(os.path.join(picture_dir, f))]
 
-    for img_path in image_paths:
+    images = []
+    for image_name in image_names:
+        img_path = os.path.join(picture_dir, image_name)
         try:
-            image = Image.open(img_path).convert('RGB')
-            tensor = transform(image).unsqueeze(0).to(device)
-            race_out = FF.predict(image)
-            obesity_out = OT.predict_obesity_class(image)
-            race_scores.append(race_out)
-            obesity_scores.append(obesity_out)
+            images.append(Image.open(img_path).convert('RGB'))
         except Exception as e:
             print(f"[WARN] Skipping {img_path} due to error: {e}")
-            race_scores.append([0.0]*7)
-            obesity_scores.append([0.0]*3)
+            images.append(None)
 
+    return build_profile_batch(image_names, images, img_size, profile)
+
+def load_images_for_prediction_dataloader(data_path, img_size, profile, batch_size=1):
+    profile_batch = load_profile_batch(data_path, img_size, profile)
     dataset = SingleImageDataset(
-        image_paths=image_paths,
-        race_vectors=race_scores,
-        obesity_vectors=obesity_scores,
-        img_size=img_size,
-        transform=transform
+        images=profile_batch.images,
+        race_vectors=profile_batch.race_scores,
+        obesity_vectors=profile_batch.obesity_scores
     )
     return DataLoader(dataset, batch_size=batch_size, shuffle=False)
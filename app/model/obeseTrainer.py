@@ -12,9 +12,11 @@ from PIL import Image
 from torchvision.models import efficientnet_b0, EfficientNet_B0_Weights
 from torchvision import transforms
 import csv
+import numpy as np
 
 model = None
 device = None
+transform = None
 
 def resource_path(relative_path):
     """ Get absolute path to resource, works for dev and for PyInstaller """
@@ -122,41 +124,52 @@ def train_model(train_loader, epoch_num=100):
 
     print("Finished Training")
 
+def get_transform():
+    global transform
+    if transform is None:
+        transform = transforms.Compose([
+            transforms.Resize((224, 224)),
+            transforms.Grayscale(num_output_channels=1),
+            transforms.ToTensor(),
+            transforms.Normalize([0.5], [0.5])
+        ])
+    return transform
+
 def predict_obesity_class(image):
     """
     Predicts obesity classification probabilities from an input PIL image.
 
     Args:
         image (PIL.Image): RGB image to evaluate.
-        model (nn.Module): Trained BodyTypeClassifier model.
 
     Returns:
         list: Softmax-normalized probabilities for [Obese, Neutral, Thin] classes.
               Example: [0.1, 0.2, 0.7]
     """
-    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-    model.eval()
-
-    transform = transforms.Compose([
-        transforms.Resize((224, 224)),
-        transforms.Grayscale(num_output_channels=1),
-        transforms.ToTensor(),
-        transforms.Normalize([0.5], [0.5])
-    ])
-
     try:
-        input_tensor = transform(image).unsqueeze(0).to(device)
-
-        with torch.no_grad():
-            logits = model(input_tensor)
-            probs = torch.softmax(logits, dim=1).squeeze().cpu().tolist()  # 3-class prob vector
-
-        return probs
-
+        return predict_obesity_batch([image])[0].tolist()
     except Exception as e:
         print(f"Error processing image: {e}")
         return [0.0, 0.0, 0.0]  # fallback in case of error
 
+def predict_obesity_batch(images):
+    """
+    Predicts obesity classification probabilities for all images of a profile in one forward pass.
+
+    Args:
+        images (list[PIL.Image]): RGB images to evaluate.
+
+    Returns:
+        np.ndarray: N x 3 softmax-normalized probabilities for [Obese, Neutral, Thin] classes.
+    """
+    if len(images) == 0:
+        return np.zeros((0, 3), dtype=np.float32)
+    trans = get_transform()
+    input_tensor = torch.stack([trans(image) for image in images]).to(device)
+    with torch.inference_mode():
+        logits = model(input_tensor)
+        return torch.softmax(logits, dim=1).cpu().numpy()
+
 # def convert_old_csv(csv_file, new_csv_file):
 #     global model, device
 #     image_root = "C:/Users/Redux/autolike/BumbleBot/DATA/e4fa3127d2b1b7137b65ed697015d407"
@@ -2,12 +2,12 @@ import tkinter as tk
 from tkinter import simpledialog
 from tkinter import messagebox
 import os
-import json
 from tkinter import ttk
 import requests
 from ui.trainPanel import TrainPanel
 from automation import makePredictions as MP
 from utils import utilities as UM
+from utils.profileStore import release_profile_folder
 from ui.reviewPanel import ReviewPanel
 import shutil
 from ui.profile_selection import ProfileSelectionPage
@@ -62,8 +62,7 @@ class MainUI(tk.Toplevel):
 
     def save_settings(self):
         """Save the current settings to settings.json"""
-        with open(os.path.join(self.settings["BASE_DIR"], "configs", "settings.json"), "w") as f:
-            json.dump(self.settings, f, indent=4)
+        UM.save_settings(self.settings)
 
     def show_profile_info_page(self, profile_path):
         # Update PROFILEPATH, MODELPATH, and DATA_INDEX in settings to the selected profile's relative path
@@ -166,7 +165,9 @@ class MainUI(tk.Toplevel):
         profile_name = os.path.basename(self.settings["PROFILEPATH"])
         del self.profile_buttons[profile_name]
         self.selected_button.destroy()
-        shutil.rmtree(os.path.join(self.settings["BASE_DIR"],self.settings["PROFILEPATH"]))
+        profile_folder = os.path.join(self.settings["BASE_DIR"],self.settings["PROFILEPATH"])
+        release_profile_folder(profile_folder)
+        shutil.rmtree(profile_folder)
         self.settings["MODELPATH"] = ""
         self.settings["DATA_INDEX"] = ""
         self.settings["PROFILEPATH"] = ""
@@ -6,6 +6,7 @@ from ui.reviewPanel import ReviewPanel
 from automation import makePredictions as MP
 import json
 from utils import utilities as UM
+from utils.profileStore import release_profile_folder
 from utils.utilities import center_window
 
 class ProfileInfoPage(tk.Frame):
@@ -88,6 +89,7 @@ class ProfileInfoPage(tk.Frame):
             weights_dir = os.path.abspath(os.path.join(self.profile_path, "..", ".."))
             profile_folder = os.path.abspath(self.profile_path)
             print(f"[DEBUG] Deleting profile folder {profile_folder}")
+            release_profile_folder(profile_folder)
             shutil.rmtree(profile_folder)
             confirm.destroy()
             self.on_back()
@@ -1,12 +1,11 @@
 import tkinter as tk
 from tkinter import Scale, ttk
 from utils import utilities as UM
+from utils.profileStore import get_profile_store, get_janitor, save_reviewed_image
+from ui.thumbnailCache import get_thumbnail_cache
 import os
-import pandas as pd
 from pathlib import Path
-import csv
 from PIL import Image, ImageTk
-import shutil
 
 class ReviewPanel(tk.Frame):
     class ImageInfo:
@@ -22,18 +21,15 @@ class ReviewPanel(tk.Frame):
         super().__init__(parent, bg="#a259c6")  # Match AuthUI theme
         self.settings = UM.load_settings()
         self.on_back = on_back
+        self.thumbnails = get_thumbnail_cache()
+        self.prefetch_count = int(self.settings.get("PREFETCH_IMAGES", 3))
         
         # Load the image paths
         self.images = []
-        predictions_path = os.path.join(self.settings["BASE_DIR"], self.settings["PROFILEPATH"], "predictions.csv")
-        if not os.path.exists(predictions_path):
-            with open(predictions_path, "w", newline="") as file:
-                writer = csv.writer(file)
-                writer.writerow(["profile","image","predicted_attractiveness","final_decision"])
-                file.flush()
-        df = pd.read_csv(predictions_path)
-        for row in df.itertuples():
-            self.images.append(self.ImageInfo(os.path.join(self.settings["BASE_DIR"], self.settings["PROFILEPATH"], "PREDICTION", row.profile, row.image), row.predicted_attractiveness, row.final_decision, row.race_score, row.obesity_score, row.profile))
+        self.store = get_profile_store(os.path.join(self.settings["BASE_DIR"], self.settings["PROFILEPATH"]))
+        self.janitor = get_janitor()
+        for row in self.store.predictions():
+            self.images.append(self.ImageInfo(os.path.join(self.settings["BASE_DIR"], self.settings["PROFILEPATH"], "PREDICTION", row["profile"], row["image"]), row["predicted_attractiveness"], row["final_decision"], row["race_score"], row["obesity_score"], row["profile"]))
         self.image_index = 0
 
         # Modern phone-like card
@@ -119,26 +115,16 @@ class ReviewPanel(tk.Frame):
     def handle_next_button(self):
         img = self.images[self.image_index]
         # First check if the prediction score is changed, if so, then store the image in the training dataset
+        # File work happens on the janitor thread, the verdict is only recorded once its image is in TRAINING
+        prediction_folder = os.path.join(self.settings["BASE_DIR"], self.settings["PROFILEPATH"], "PREDICTION", img.profile)
         if abs(self.attr_slider.get() - self.images[self.image_index].score) >= 0.1:
-            training_path = os.path.join(self.settings["BASE_DIR"], self.settings["PROFILEPATH"], "TRAINING")
-            os.makedirs(training_path, exist_ok=True)
-            verdict_path = os.path.join(self.settings["BASE_DIR"], self.settings["PROFILEPATH"], "user_verdicts.csv")
-            file_exists = os.path.exists(verdict_path)
-            with open(verdict_path, "a" if file_exists else "w", newline="") as file:
-                writer = csv.writer(file)
-                if not file_exists:
-                    writer.writerow(["image","outcome","race_scores","obese_scores"])
-                img_name = img.profile + ".png"
-                writer.writerow([img_name, self.attr_slider.get(), img.race_score, img.obesity_score])
-                
-            shutil.copy(img.image_path, os.path.join(self.settings["BASE_DIR"], self.settings["PROFILEPATH"], "TRAINING", img_name))
-                
-        predictions_path = os.path.join(self.settings["BASE_DIR"], self.settings["PROFILEPATH"], "predictions.csv")
-        df = pd.read_csv(predictions_path)
-        df = df[df["profile"] != img.profile]
-        df.to_csv(predictions_path, index=False)
-            
-        shutil.rmtree(os.path.join(self.settings["BASE_DIR"], self.settings["PROFILEPATH"], "PREDICTION", img.profile))
+            img_name = img.profile + (os.path.splitext(img.image_path)[1] or ".png")
+            verdict = (img_name, self.attr_slider.get(), img.race_score, img.obesity_score)
+            training_image = os.path.join(self.settings["BASE_DIR"], self.settings["PROFILEPATH"], "TRAINING", img_name)
+            self.janitor.submit(save_reviewed_image, self.store, img.profile, verdict, img.image_path, training_image, prediction_folder)
+        else:
+            self.store.commit_review(img.profile)
+            self.janitor.remove(prediction_folder)
                 
         self.image_index += 1
         self.progress_label.config(text=f"Image {self.image_index + 1} of {len(self.images)}")
@@ -190,15 +176,13 @@ class ReviewPanel(tk.Frame):
     
     def load_image_to_label(self, image_path, fixed_height=300):
         try:
-            image = Image.open(image_path).convert("RGB")
-            width, height = image.size
-            aspect_ratio = width / height
-            new_height = fixed_height
-            new_width = int(aspect_ratio * new_height)
-            resized_image = image.resize((new_width, new_height), Image.Resampling.LANCZOS)
+            # Decoding and resizing happened ahead of time on the prefetch thread, only the Tk conversion runs here
+            resized_image = self.thumbnails.get(image_path, fixed_height)
             tk_image = ImageTk.PhotoImage(resized_image)
             self.image_label.image = tk_image
             self.image_label.config(image=tk_image)
         except Exception as e:
             print(f"[ERROR] Failed to load image {image_path}: {e}")
+        upcoming = self.images[self.image_index + 1:self.image_index + 1 + self.prefetch_count]
+        self.thumbnails.prefetch([img.image_path for img in upcoming], fixed_height)
         
\ No newline at end of file
@@ -1,13 +1,13 @@
 import threading
 import time
+import queue
 from model import machineLearning as ML
 from model.machineLearning import InterestRegressorWithMetadata
 from automation import bumbleMethods as BM
 from utils import utilities as UM
+from utils.profileStore import PredictionLog, get_profile_store
 import numpy as np
 import os
-import csv
-import shutil
 import random
 import torch
 
@@ -32,6 +32,7 @@ class SwipeController:
             self.settings = UM.load_settings()
             self._load_model()
             print("[DEBUG] Loading browser")
+            BM.bind_browser(self.browser)
             self.browser.LoadUrl("https://bumble.com/app")
             self._wait_for_login()
         except Exception as e:
@@ -48,6 +49,8 @@ class SwipeController:
             loaded_state_dict = torch.load(load_path, map_location=device)
             self.loaded_model.load_state_dict(loaded_state_dict)
             self.loaded_model.to(device)
+            if self.settings.get("CHANNELS_LAST", False):
+                self.loaded_model.to(memory_format=torch.channels_last)
             self.loaded_model.eval()
         except Exception as e:
             self.set_status("Couldn't load existing model. Please train a model first.")
@@ -85,34 +88,43 @@ class SwipeController:
     def _cleanup(self):
         self.root_alive = False
 
-    def _clear_overflow_profile(self, prediction_csv_path, max_profile_number=100):
-        """Clear old profiles from storage"""
-        existing_rows = []
-        with open(prediction_csv_path, "r", newline="") as file:
-            reader = csv.reader(file)
-            for row in reader:
-                if row:
-                    existing_rows.append(row)
-            num_profiles = len(existing_rows) - 1
-            existing_rows = existing_rows[1:]  # Skip the first title row
-            if num_profiles <= max_profile_number:
+    def _score_profile(self, datafp):
+        """Download the profile on screen and score all of its photos"""
+        downloaded = BM.download_profile(self.browser, harvest_timeout=float(self.settings.get("HARVEST_TIMEOUT", 5.0)))
+        if downloaded is None:
+            return 'invalid', None, None
+        # Decoded images go straight to the models, the original bytes are written for the Review panel afterwards
+        profile_batch = ML.build_profile_batch(downloaded.image_names, downloaded.images, int(self.settings["IMG_SIZE"]), downloaded.profile)
+        raw_predictions = ML.predict_profile(self.loaded_model, profile_batch, channels_last=self.settings.get("CHANNELS_LAST", False))
+        BM.save_profile_async(downloaded, datafp)
+        return downloaded.profile, profile_batch, raw_predictions
+
+    def _scoring_worker(self, requests, results):
+        while True:
+            datafp = requests.get()
+            if datafp is None:
+                return
+            try:
+                results.put(self._score_profile(datafp))
+            except Exception as e:
+                print(f"[ERROR] Failed to score profile: {e}")
+                results.put(('invalid', None, None))
+
+    def _logging_worker(self, log_queue, prediction_log):
+        while True:
+            # Whatever queued up meanwhile goes into the same transaction
+            rows = [log_queue.get()]
+            while True:
+                try:
+                    rows.append(log_queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                prediction_log.append([row for row in rows if row is not None])
+            except Exception as e:
+                print(f"[ERROR] Failed to log prediction: {e}")
+            if None in rows:
                 return
-
-        with open(prediction_csv_path, "w", newline="") as file:
-            writer = csv.writer(file)
-            writer.writerow(["profile","image","race_score","obesity_score","predicted_attractiveness","final_decision"])
-            for i in range(max_profile_number):
-                writer.writerow(existing_rows[num_profiles - max_profile_number + i])
-            
-            # Remove old profile folders
-            for i in range(num_profiles - max_profile_number):
-                user_name = os.path.splitext(os.path.basename(self.settings["MODELPATH"]))[0]
-                folder_path = os.path.join(self.settings['BASE_DIR'],"weights",user_name,"PREDICTION",existing_rows[i][0])
-                if os.path.exists(folder_path):
-                    try:
-                        shutil.rmtree(folder_path)
-                    except Exception as e:
-                        print(f"Error removing folder '{folder_path}': {e}")
 
     def _swipe_on_background(self):
         """Main swiping process"""
@@ -125,19 +137,20 @@ class SwipeController:
         os.makedirs(folder_path, exist_ok=True)
         datafp = os.path.join(folder_path, "PREDICTION")
         os.makedirs(datafp, exist_ok=True)
-        prediction_csv_path = os.path.join(folder_path, f"predictions.csv")
-        
-        if not os.path.exists(prediction_csv_path):
-            with open(prediction_csv_path, "w", newline="") as file:
-                writer = csv.writer(file)
-                writer.writerow(["profile","image","race_score","obesity_score","predicted_attractiveness","final_decision"])
-
-        self._clear_overflow_profile(prediction_csv_path, self.settings["MAX_PROFILE_STORED"])
+        prediction_log = PredictionLog(get_profile_store(folder_path), datafp, self.settings["MAX_PROFILE_STORED"])
 
         # Main swiping loop
-        with open(prediction_csv_path, "a+", newline="") as file:
-            print("[DEBUG] CSV opened")
-            writer = csv.writer(file)
+        # Downloading and scoring the profile on screen runs on its own thread while the swipe thread waits out the
+        # human-like dwell time, and logging/cleanup of the previous profile runs on another. The queues are
+        # bounded so no stage can run more than one profile ahead.
+        requests = queue.Queue(maxsize=1)
+        results = queue.Queue(maxsize=1)
+        log_queue = queue.Queue(maxsize=8)
+        scorer = threading.Thread(target=self._scoring_worker, args=(requests, results), daemon=True)
+        logger = threading.Thread(target=self._logging_worker, args=(log_queue, prediction_log), daemon=True)
+        scorer.start()
+        logger.start()
+        try:
             counter = int(self.settings["TOTALSWIPES"])
             print("[DEBUG] Counter and root alive", counter, self.root_alive)
             while counter > 0 and self.root_alive:
@@ -145,32 +158,29 @@ class SwipeController:
                 counter = counter - 1
                 value = np.random.normal(loc=3, scale=0.3)
                 self.set_status(f"Swiping... {counter} swipes left.")
-                time.sleep(value)
+                deadline = time.monotonic() + value
+
+                requests.put(datafp)
+                profile, profile_batch, raw_predictions = results.get()
+                remaining = deadline - time.monotonic()
+                if remaining > 0:
+                    time.sleep(remaining)
 
-                profile = BM.find_download_all_pictures(self.browser, datafp)
                 if profile == 'invalid':
                     self.set_status("No photos detected, skipping profile.")
                     continue
 
-                # Make predictions
-                profile_dataloader = ML.load_images_for_prediction_dataloader(datafp, int(self.settings["IMG_SIZE"]), profile)
-                raw_predictions, race_scores, obesity_scores = ML.predict(self.loaded_model, profile_dataloader)
-                
-                avg_prediction = np.mean(raw_predictions) if raw_predictions else 0.0
+                avg_prediction = float(np.mean(raw_predictions)) if len(raw_predictions) else 0.0
                 decision_threshold = float(self.settings.get('THRESH', 0.2))
-                decision = 1 if avg_prediction > decision_threshold or sum(1 for item in raw_predictions if item > 0.9) >= 2 else 0
+                decision = 1 if avg_prediction > decision_threshold or np.count_nonzero(raw_predictions > 0.9) >= 2 else 0
                 
                 self.set_status(f"Profile: {profile}\nAvg score: {avg_prediction:.4f}\nDecision: {'Like' if decision else 'Dislike'}")
 
                 # Log results
-                image_files = sorted(os.listdir(os.path.join(datafp, profile)))
-                if image_files:
-                    idx = random.randint(0, len(image_files) - 1)
-                    image_file = image_files[idx]
-                    writer.writerow([profile, image_file, race_scores[idx], obesity_scores[idx], raw_predictions[idx], decision])
-                file.flush()
-                
-                self._clear_overflow_profile(prediction_csv_path, self.settings["MAX_PROFILE_STORED"])
+                if len(profile_batch):
+                    idx = random.randint(0, len(profile_batch) - 1)
+                    image_file = profile_batch.image_names[idx]
+                    log_queue.put([profile, image_file, profile_batch.race_scores[idx].tolist(), profile_batch.obesity_scores[idx].tolist(), float(raw_predictions[idx]), decision])
 
                 # Perform swipe
                 if decision == 1:
@@ -178,6 +188,10 @@ class SwipeController:
                 else:
                     BM.dislike_profile(self.browser)
                 time.sleep(2)
+        finally:
+            requests.put(None)
+            log_queue.put(None)
+            logger.join()
 
         self.set_status("Click to swipe again")
         self.show_continue()
@@ -0,0 +1,75 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from PIL import Image
+
+# Small LRU cache of decoded and resized images for the Trainer and Review panels
+# A background thread prepares the next images ahead of the cursor, the panels only convert them to ImageTk.PhotoImage
+# capacity: how many resized images are kept
+
+class ThumbnailCache:
+    def __init__(self, capacity=16):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="thumbnail-prefetch")
+
+    @staticmethod
+    def load(image_path, fixed_height=300):
+        image = Image.open(image_path).convert("RGB")
+        width, height = image.size
+        aspect_ratio = width / height
+        new_height = fixed_height
+        new_width = int(aspect_ratio * new_height)
+        return image.resize((new_width, new_height), Image.Resampling.LANCZOS)
+
+    def _put(self, key, future):
+        self.entries[key] = future
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+    # Returns the resized image, waits for it if it is being prefetched and loads it right away if it was never requested
+    def get(self, image_path, fixed_height=300):
+        key = (image_path, fixed_height)
+        with self.lock:
+            future = self.entries.get(key)
+            if future is not None:
+                self.entries.move_to_end(key)
+        if future is None:
+            future = Future()
+            try:
+                future.set_result(self.load(image_path, fixed_height))
+            except Exception as e:
+                future.set_exception(e)
+            with self.lock:
+                self._put(key, future)
+        try:
+            return future.result()
+        except Exception:
+            # Don't keep failures around, the file may show up later
+            with self.lock:
+                if self.entries.get(key) is future:
+                    del self.entries[key]
+            raise
+
+    # Queues the images that aren't cached yet, in order
+    def prefetch(self, image_paths, fixed_height=300):
+        with self.lock:
+            for image_path in image_paths:
+                key = (image_path, fixed_height)
+                if key not in self.entries:
+                    self._put(key, self.executor.submit(self.load, image_path, fixed_height))
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+_thumbnail_cache = None
+_thumbnail_cache_lock = threading.Lock()
+
+def get_thumbnail_cache():
+    global _thumbnail_cache
+    with _thumbnail_cache_lock:
+        if _thumbnail_cache is None:
+            _thumbnail_cache = ThumbnailCache()
+        return _thumbnail_cache
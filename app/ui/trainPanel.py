@@ -2,16 +2,24 @@ import tkinter as tk
 from utils import utilities as UM
 import os
 import csv
-import pandas as pd
 from tkinter import Scale
-from PIL import Image, ImageTk
+from PIL import ImageTk
 from tkinter.ttk import Progressbar
 import threading
 from model import machineLearning as ML
+from utils.profileStore import get_profile_store
+from ui.thumbnailCache import get_thumbnail_cache
 
 def count_pngs(folder_path):
     return len([f for f in os.listdir(folder_path) if f.lower().endswith('.png')])
 
+def load_ground_truth(csv_path):
+    """ Rows of init_data.csv keyed by image name, in file order """
+    if not os.path.exists(csv_path):
+        return {}
+    with open(csv_path, "r", newline="") as file:
+        return {row["image"]: row for row in csv.DictReader(file)}
+
 class TrainPanel(tk.Frame):
     def __init__(self, parent, on_back=None):
         super().__init__(parent, bg="#a259c6")
@@ -19,25 +27,23 @@ class TrainPanel(tk.Frame):
         self.cancel_training = False
         self.training_in_progress = False
         self.on_back = on_back
+        self.thumbnails = get_thumbnail_cache()
+        self.prefetch_count = int(self.settings.get("PREFETCH_IMAGES", 3))
 
         # Profile-specific paths
         profile_dir = os.path.join(self.settings["BASE_DIR"], self.settings["PROFILEPATH"])
-        profile_name = os.path.basename(profile_dir)
-        self.profile_csv_path = os.path.join(profile_dir, f"{profile_name}.csv")
+        self.store = get_profile_store(profile_dir)
         
         # Use global init_data folder for images and ground truth
         self.init_data_folder = os.path.join(self.settings["BASE_DIR"], self.settings.get("INIT_DATA_PATH", ""))
-        self.ground_truth = pd.read_csv(os.path.join(self.init_data_folder, "init_data.csv")) if os.path.exists(os.path.join(self.init_data_folder, "init_data.csv")) else pd.DataFrame()
+        self.ground_truth = load_ground_truth(os.path.join(self.init_data_folder, "init_data.csv"))
 
-        # Load progress
-        if os.path.exists(self.profile_csv_path):
-            self.progress_df = pd.read_csv(self.profile_csv_path)
-        else:
-            self.progress_df = pd.DataFrame(columns=["image","outcome","race_scores","obese_scores"])
+        # Load progress, the label of each image keyed by image name
+        self.progress = {row["image"]: row["outcome"] for row in self.store.progress()}
 
         # Find next image index
-        done_images = set(self.progress_df["image"]) if not self.progress_df.empty else set()
-        self.image_list = list(self.ground_truth["image"]) if not self.ground_truth.empty else []
+        done_images = set(self.progress)
+        self.image_list = list(self.ground_truth)
         self.image_index = 0
         for idx, img in enumerate(self.image_list):
             if img not in done_images:
@@ -99,7 +105,7 @@ class TrainPanel(tk.Frame):
         accuracy_frame.pack(pady=(0, 10))
         tk.Label(accuracy_frame, text="Training Accuracy:", font=("Arial", 12), bg="white").pack(side=tk.LEFT, padx=5)
         self.accuracy_var = tk.StringVar(value="Moderate")
-        accuracy_options = ["Accurate", "Moderate", "Basic", "Custom"]
+        accuracy_options = ["Accurate", "Moderate", "Basic", "Quick", "Fast", "Incremental", "Custom"]
         self.accuracy_menu = tk.OptionMenu(accuracy_frame, self.accuracy_var, *accuracy_options, command=self.handle_accuracy_selection)
         self.accuracy_menu.config(width=10)
         self.accuracy_menu.pack(side=tk.LEFT)
@@ -111,10 +117,8 @@ class TrainPanel(tk.Frame):
         self.train_button.pack(side=tk.LEFT, padx=16, ipadx=12, ipady=3, pady=7)
 
         # Feedback label just above action_frame at the bottom
-        verdict_path = os.path.join(self.settings["BASE_DIR"], self.settings["PROFILEPATH"], "user_verdicts.csv")
-        if os.path.exists(verdict_path):
-            df = pd.read_csv(verdict_path)
-            feedbackNum = len(df)
+        feedbackNum = self.store.count("verdicts")
+        if feedbackNum > 0:
             self.feedback_label = tk.Label(
                 card,
                 text=f"You also made {feedbackNum} feedbacks that will go together into the training process.",
@@ -131,17 +135,15 @@ class TrainPanel(tk.Frame):
 
     def load_image_to_label(self, label_widget, image_path, fixed_height=300):
         try:
-            image = Image.open(image_path).convert("RGB")
-            width, height = image.size
-            aspect_ratio = width / height
-            new_height = fixed_height
-            new_width = int(aspect_ratio * new_height)
-            resized_image = image.resize((new_width, new_height), Image.Resampling.LANCZOS)
+            # Decoding and resizing happened ahead of time on the prefetch thread, only the Tk conversion runs here
+            resized_image = self.thumbnails.get(image_path, fixed_height)
             tk_image = ImageTk.PhotoImage(resized_image)
             label_widget.image = tk_image
             label_widget.config(image=tk_image)
         except Exception as e:
             print(f"[ERROR] Failed to load image {image_path}: {e}")
+        upcoming = self.image_list[self.image_index + 1:self.image_index + 1 + self.prefetch_count]
+        self.thumbnails.prefetch([os.path.join(self.init_data_folder, img) for img in upcoming], fixed_height)
 
     def handle_accuracy_selection(self, value):
         if value == "Custom":
@@ -157,37 +159,17 @@ class TrainPanel(tk.Frame):
         self.load_image_to_label(self.image_label, image_path)
         # Restore value if present
         img_name = self.image_list[self.image_index]
-        match = self.progress_df["image"] == img_name
-        if match.any():
-            stored_attractiveness = self.progress_df.loc[match, "outcome"].values[0]
-            self.attr_slider.set(stored_attractiveness)
-        else:
-            self.attr_slider.set(0)
+        self.attr_slider.set(self.progress.get(img_name, 0))
         self.next_button.config(state=tk.NORMAL)
         if self.image_index == 0:
             self.prev_button.config(state=tk.DISABLED)
 
     def handle_next_button(self):
-        # Write the current slider value into csv
+        # Write the current slider value into the profile store
         img_name = self.image_list[self.image_index]
-        row_dict = self.ground_truth.loc[self.ground_truth["image"] == img_name].iloc[0].to_dict()
-        match = self.progress_df["image"] == img_name
-        if match.any():
-            # Update row if already exist
-            self.progress_df.loc[match, "outcome"] = self.attr_slider.get()
-            self.progress_df.loc[match, "race_scores"] = row_dict["race_scores"]
-            self.progress_df.loc[match, "obese_scores"] = row_dict["obese_scores"]
-        else:
-            # Append a new row
-            new_row = {
-                "image": row_dict["image"],
-                "outcome": self.attr_slider.get(),
-                "race_scores": row_dict["race_scores"],
-                "obese_scores": row_dict["obese_scores"]
-            }
-            self.progress_df = pd.concat([self.progress_df, pd.DataFrame([new_row])], ignore_index=True)
-        # Save the updated DataFrame back to the CSV
-        self.save_progress()
+        self.progress[img_name] = self.attr_slider.get()
+        # Save the label to the profile store, inserts the row or updates it if it already exists
+        self.save_progress(img_name)
         self.image_index += 1
         if self.image_index < len(self.image_list):
             image_path = os.path.join(self.init_data_folder, self.image_list[self.image_index])
@@ -195,11 +177,7 @@ class TrainPanel(tk.Frame):
             self.next_button.config(state=tk.NORMAL)
             # Restore value if present
             img_name = self.image_list[self.image_index]
-            match = self.progress_df["image"] == img_name
-            if match.any():
-                self.attr_slider.set(float(self.progress_df.loc[match, "outcome"]))
-            else:
-                self.attr_slider.set(0)
+            self.attr_slider.set(self.progress.get(img_name, 0))
         else:
             self.next_button.config(state=tk.DISABLED)
             image_path = os.path.join(self.settings["BASE_DIR"], "images", "ui", "AllDone.png")
@@ -233,25 +211,31 @@ class TrainPanel(tk.Frame):
         settings = UM.load_settings()
         ML.init_models()
 
-        train_loader, _ = ML.construct_dataset(
-            os.path.normpath(os.path.join(settings["BASE_DIR"], settings["DATA_INDEX"])),
-            os.path.normpath(os.path.join(settings["BASE_DIR"], settings["PROFILEPATH"], "user_verdicts.csv")),
-            os.path.normpath(os.path.join(settings["BASE_DIR"], settings["INIT_DATA_PATH"])),
-            int(settings["IMG_SIZE"]),
-            int(settings["BATCH_SIZE"]),
-            float(settings["TTS"])
-        )
-
         total_epochs = 200
         model_path = os.path.normpath(os.path.join(settings["BASE_DIR"],settings["MODELPATH"]))
 
         accuracy_choice = self.accuracy_var.get()
-        if accuracy_choice == "Accurate (500 epochs)":
+        head_only = False
+        mixed_precision = False
+        incremental = False
+        if accuracy_choice == "Accurate":
             total_epochs = 500
-        elif accuracy_choice == "Moderate (200 epochs)":
+        elif accuracy_choice == "Moderate":
             total_epochs = 200
-        elif accuracy_choice == "Basic (100 epochs)":
+        elif accuracy_choice == "Basic":
             total_epochs = 100
+        elif accuracy_choice == "Quick":
+            # Only retrain the head on cached backbone embeddings, epochs take milliseconds
+            total_epochs = 500
+            head_only = True
+        elif accuracy_choice == "Fast":
+            # Full training with bf16 autocast on CPU / AMP on CUDA
+            total_epochs = 200
+            mixed_precision = True
+        elif accuracy_choice == "Incremental":
+            # Fine-tune on feedback the model hasn't seen yet plus a replay sample of older data
+            total_epochs = int(settings.get("INCREMENTAL_EPOCHS", 20))
+            incremental = True
         elif accuracy_choice == "Custom":
             try:
                 total_epochs = int(self.custom_epoch_entry.get())
@@ -259,21 +243,69 @@ class TrainPanel(tk.Frame):
                 total_epochs = 100  # fallback default
         else:
             total_epochs = 200  # fallback default
+        epoch_hint = "" if head_only or incremental else " (it takes around 1 minute for each epoch)"
+
+        data_args = (
+            os.path.normpath(os.path.join(settings["BASE_DIR"], settings["DATA_INDEX"])),
+            os.path.normpath(os.path.join(settings["BASE_DIR"], settings["PROFILEPATH"], "user_verdicts.csv")),
+            os.path.normpath(os.path.join(settings["BASE_DIR"], settings["INIT_DATA_PATH"])),
+            int(settings["IMG_SIZE"]),
+            int(settings["BATCH_SIZE"])
+        )
+        loader_kwargs = dict(
+            image_cache_dir=os.path.normpath(os.path.join(settings["BASE_DIR"], settings["PROFILEPATH"], "image_cache")),
+            num_workers=int(settings.get("NUM_WORKERS", 0)),
+            prefetch_factor=int(settings.get("PREFETCH_FACTOR", 2)),
+            store=self.store
+        )
+        if incremental:
+            test_loader = None
+            train_loader = ML.construct_incremental_dataset(
+                *data_args,
+                ML.load_seen_verdicts(model_path),
+                float(settings["TTS"]),
+                replay_ratio=float(settings.get("REPLAY_RATIO", 2.0)),
+                **loader_kwargs
+            )
+            if train_loader is None:
+                self.after(0, lambda: self.epoch_label.config(text="No new feedback since the last training."))
+                self.after(3000, self.training_finished)
+                return
+        else:
+            train_loader, test_loader = ML.construct_dataset(*data_args, float(settings["TTS"]), **loader_kwargs)
 
         self.after(0, lambda: self.progress_bar.config(maximum=total_epochs))
 
+        speedup_text = [""]
+
         def log_progress(epoch):
             self.after(0, lambda: self.progress_bar.config(value=epoch - 1))
-            self.after(0, lambda: self.epoch_label.config(text=f"Epoch {epoch} / {total_epochs} (it takes around 1 minute for each epoch)"))
+            self.after(0, lambda: self.epoch_label.config(text=f"Epoch {epoch} / {total_epochs}{epoch_hint}{speedup_text[0]}"))
+
+        def log_status(message):
+            speedup_text[0] = f"\n{message}"
 
-        ML.train_classifier_with_metadata(
+        saved = ML.train_classifier_with_metadata(
             train_loader=train_loader,
             num_epochs=total_epochs,
             image_size=int(settings["IMG_SIZE"]),
             model_path=model_path,
             cancel_flag=lambda: self.cancel_training,
-            progress_callback=log_progress
+            progress_callback=log_progress,
+            head_only=head_only,
+            mixed_precision=mixed_precision,
+            compile_model=mixed_precision and bool(settings.get("COMPILE_MODEL", False)),
+            status_callback=log_status,
+            val_loader=test_loader,
+            patience=int(settings["PATIENCE"]) if settings.get("PATIENCE") else None,
+            checkpoint_every=int(settings.get("CHECKPOINT_EVERY", 1)),
+            save_best_only=bool(settings.get("SAVE_BEST_ONLY", True)),
+            embedding_cache_path=os.path.normpath(os.path.join(settings["BASE_DIR"], settings["PROFILEPATH"], "embedding_cache.npz"))
         )
+        if saved and not self.cancel_training:
+            # Only a written checkpoint has learned these verdicts
+            # Full runs retrain from everything in their split, so they reset what the checkpoint has seen
+            ML.mark_verdicts_seen(model_path, train_loader, replace=not incremental)
 
         self.after(0, self.training_finished)
     
@@ -296,7 +328,7 @@ class TrainPanel(tk.Frame):
         if self.on_back:
             self.on_back()
 
-    def save_progress(self):
-        """Save the current progress DataFrame to the profile's CSV file"""
-        print(f"[DEBUG] Saving progress to {self.profile_csv_path}")
-        self.progress_df.to_csv(self.profile_csv_path, index=False)
\ No newline at end of file
+    def save_progress(self, img_name):
+        """Save the label of img_name with its ground truth scores to the profile store"""
+        row = self.ground_truth[img_name]
+        self.store.save_progress(img_name, self.progress[img_name], row["race_scores"], row["obese_scores"])
\ No newline at end of file
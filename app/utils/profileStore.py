@@ -0,0 +1,292 @@
+import contextlib
+import csv
+import os
+import queue
+import random
+import shutil
+import sqlite3
+import threading
+
+STORE_FILENAME = "profile.db"
+PREDICTION_COLUMNS = ["profile","image","race_score","obesity_score","predicted_attractiveness","final_decision"]
+LABEL_COLUMNS = ["image","outcome","race_scores","obese_scores"]
+
+class FolderJanitor:
+    """
+    Runs file work (copies, folder deletes) on a background thread so the caller never waits on the disk.
+    Tasks run one at a time in the order they were queued.
+    """
+    def __init__(self):
+        self.tasks = queue.Queue()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def remove(self, folder_path):
+        self.tasks.put((self.remove_now, folder_path))
+
+    def submit(self, task, *args):
+        self.tasks.put((task, *args))
+
+    def remove_now(self, folder_path):
+        if os.path.exists(folder_path):
+            shutil.rmtree(folder_path)
+
+    def copy_now(self, source_path, target_path):
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        shutil.copy(source_path, target_path)
+
+    def run(self):
+        while True:
+            task = self.tasks.get()
+            if task is None:
+                self.tasks.task_done()
+                return
+            try:
+                task[0](*task[1:])
+            except Exception as e:
+                print(f"[ERROR] File task {task[0].__name__}{task[1:]} failed: {e}")
+            finally:
+                self.tasks.task_done()
+
+    def drain(self):
+        """ Blocks until every task queued so far has run """
+        self.tasks.join()
+
+    def close(self, wait=True):
+        self.tasks.put(None)
+        if wait:
+            self.thread.join()
+
+_janitor = None
+_janitor_lock = threading.Lock()
+
+def get_janitor():
+    global _janitor
+    with _janitor_lock:
+        if _janitor is None:
+            _janitor = FolderJanitor()
+        return _janitor
+
+class ProfileStore:
+    """
+    Everything a profile records locally, in one SQLite file (WAL mode) instead of predictions.csv, user_verdicts.csv
+    and <profile>.csv. Rows are keyed by profile / image name so lookups, upserts and deletes don't touch the rest of the table.
+    One connection is shared by the UI, swipe and training threads, calls are serialized by a lock.
+    """
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS predictions (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            profile TEXT NOT NULL UNIQUE,
+            image TEXT NOT NULL,
+            race_score TEXT,
+            obesity_score TEXT,
+            predicted_attractiveness REAL,
+            final_decision INTEGER
+        );
+        CREATE TABLE IF NOT EXISTS verdicts (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            image TEXT NOT NULL UNIQUE,
+            outcome REAL,
+            race_scores TEXT,
+            obese_scores TEXT
+        );
+        CREATE TABLE IF NOT EXISTS progress (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            image TEXT NOT NULL UNIQUE,
+            outcome REAL,
+            race_scores TEXT,
+            obese_scores TEXT
+        );
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.transaction() as conn:
+            conn.executescript(self.SCHEMA)
+            # store_id tells a recreated database apart from the one a cached dataset index was built from
+            conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('store_id', ?)", (str(random.getrandbits(62)),))
+            conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('revision', '0')")
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """ One commit for everything written inside the block, rolled back on error """
+        with self.lock:
+            with self.conn:
+                yield self.conn
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def query(self, sql, params=()):
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def count(self, table):
+        return self.query(f"SELECT COUNT(*) FROM {table}")[0][0]
+
+    def get_meta(self, key, default=None):
+        rows = self.query("SELECT value FROM meta WHERE key = ?", (key,))
+        return rows[0][0] if rows else default
+
+    def set_meta(self, conn, key, value):
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def bump_revision(self, conn):
+        # Training data changed, invalidates cached dataset indexes
+        conn.execute("UPDATE meta SET value = CAST(value AS INTEGER) + 1 WHERE key = 'revision'")
+
+    def signature(self):
+        """ (store id, revision) of the training tables """
+        return int(self.get_meta("store_id", 0)), int(self.get_meta("revision", 0))
+
+    # Predictions made while swiping, oldest first
+    def predictions(self):
+        return self.query(f"SELECT {', '.join(PREDICTION_COLUMNS)} FROM predictions ORDER BY seq")
+
+    def add_predictions(self, rows, max_rows=None):
+        """
+        Inserts prediction rows in one transaction and drops everything but the newest max_rows.
+
+        Returns:
+            list[str]: profiles that were dropped
+        """
+        with self.transaction() as conn:
+            conn.executemany(
+                f"INSERT OR REPLACE INTO predictions ({', '.join(PREDICTION_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?)",
+                [(row[0], row[1], str(row[2]), str(row[3]), float(row[4]), int(row[5])) for row in rows])
+            if max_rows is None:
+                return []
+            evicted = [row[0] for row in conn.execute(
+                "SELECT profile FROM predictions ORDER BY seq DESC LIMIT -1 OFFSET ?", (int(max_rows),))]
+            conn.executemany("DELETE FROM predictions WHERE profile = ?", [(profile,) for profile in evicted])
+            return evicted
+
+    def commit_review(self, profile, verdict=None):
+        """ Removes a reviewed prediction and records its verdict (image, outcome, race_scores, obese_scores) in one transaction """
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM predictions WHERE profile = ?", (profile,))
+            if verdict is not None:
+                self.upsert(conn, "verdicts", [verdict])
+
+    # User feedback from the Review panel
+    def verdicts(self):
+        return self.query(f"SELECT {', '.join(LABEL_COLUMNS)} FROM verdicts ORDER BY seq")
+
+    # Labels of the init images from the Trainer panel
+    def progress(self):
+        return self.query(f"SELECT {', '.join(LABEL_COLUMNS)} FROM progress ORDER BY seq")
+
+    def save_progress(self, image, outcome, race_scores, obese_scores):
+        with self.transaction() as conn:
+            self.upsert(conn, "progress", [(image, outcome, race_scores, obese_scores)])
+
+    def upsert(self, conn, table, rows):
+        conn.executemany(
+            f"INSERT INTO {table} (image, outcome, race_scores, obese_scores) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(image) DO UPDATE SET outcome = excluded.outcome, race_scores = excluded.race_scores, obese_scores = excluded.obese_scores",
+            [(str(image), float(outcome), str(race_scores), str(obese_scores)) for image, outcome, race_scores, obese_scores in rows])
+        self.bump_revision(conn)
+
+    def import_csvs(self, profile_dir):
+        """ One-time import of the CSV files older versions kept in the profile folder, the files are left untouched """
+        profile_name = os.path.basename(os.path.normpath(profile_dir))
+        sources = [("predictions.csv", self.import_predictions),
+                   ("user_verdicts.csv", lambda conn, rows: self.upsert(conn, "verdicts", rows)),
+                   (f"{profile_name}.csv", lambda conn, rows: self.upsert(conn, "progress", rows))]
+        for file_name, import_rows in sources:
+            csv_path = os.path.join(profile_dir, file_name)
+            meta_key = f"imported:{file_name}"
+            if self.get_meta(meta_key) is not None or not os.path.exists(csv_path):
+                continue
+            try:
+                with open(csv_path, "r", newline="") as file:
+                    reader = csv.DictReader(file)
+                    columns = PREDICTION_COLUMNS if file_name == "predictions.csv" else LABEL_COLUMNS
+                    rows = [[row.get(column) for column in columns] for row in reader if row.get(columns[0])]
+                with self.transaction() as conn:
+                    import_rows(conn, rows)
+                    self.set_meta(conn, meta_key, len(rows))
+                print(f"[DEBUG] Imported {len(rows)} rows from {csv_path}")
+            except Exception as e:
+                print(f"[ERROR] Failed to import {csv_path}: {e}")
+
+    def import_predictions(self, conn, rows):
+        def decision(value):
+            return 1 if str(value).strip().lower() in ("1", "1.0", "true") else 0
+        conn.executemany(
+            f"INSERT OR IGNORE INTO predictions ({', '.join(PREDICTION_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?)",
+            [(row[0], row[1], row[2], row[3], float(row[4] or 0), decision(row[5])) for row in rows])
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+def get_profile_store(profile_dir):
+    """ The shared store of a profile folder, created and filled from its old CSV files on first use """
+    db_path = os.path.normpath(os.path.join(profile_dir, STORE_FILENAME))
+    with _stores_lock:
+        store = _stores.get(db_path)
+        if store is None:
+            os.makedirs(profile_dir, exist_ok=True)
+            store = ProfileStore(db_path)
+            store.import_csvs(profile_dir)
+            _stores[db_path] = store
+        return store
+
+def close_profile_store(profile_dir):
+    """
+    Closes and forgets the store of a profile folder, must run before the folder is deleted.
+    Objects still holding the closed store (ReviewPanel, TrainPanel, PredictionLog) raise sqlite3.ProgrammingError on
+    their next call. They are deliberately not re-pointed at a new store, that would recreate the deleted folder, so
+    only close a profile once nothing that uses it is still open.
+    """
+    db_path = os.path.normpath(os.path.join(profile_dir, STORE_FILENAME))
+    with _stores_lock:
+        store = _stores.pop(db_path, None)
+    if store is not None:
+        store.close()
+
+def release_profile_folder(profile_dir):
+    """ Lets go of everything holding files open in a profile folder so it can be removed """
+    close_profile_store(profile_dir)
+    get_janitor().drain()
+
+def save_reviewed_image(store, profile, verdict, source_path, target_path, prediction_folder):
+    """
+    Copies a reviewed image into the training folder, then records its verdict, drops the prediction and removes
+    the profile folder. If the copy fails nothing is recorded or removed, the profile stays up for the next review.
+    """
+    janitor = get_janitor()
+    try:
+        janitor.copy_now(source_path, target_path)
+    except Exception as e:
+        print(f"[ERROR] Could not copy {source_path} to {target_path}, keeping {profile} for review: {e}")
+        return
+    store.commit_review(profile, verdict)
+    janitor.remove_now(prediction_folder)
+
+class PredictionLog:
+    """
+    Swipe predictions bounded to the most recent max_rows profiles.
+    Folders of profiles that fall out of the log are removed by the janitor thread.
+    """
+    def __init__(self, store, prediction_dir, max_rows):
+        self.store = store
+        self.prediction_dir = prediction_dir
+        self.max_rows = int(max_rows)
+        self.janitor = get_janitor()
+        self.append([])
+
+    def append(self, rows):
+        """ rows: prediction rows written in a single transaction """
+        for profile in self.store.add_predictions(rows, self.max_rows):
+            self.janitor.remove(os.path.join(self.prediction_dir, profile))
@@ -2,6 +2,7 @@ import json
 from pathlib import Path
 import sys
 import os
+import threading
 
 def get_executable_dir_path(relative_path=""):
     """
@@ -38,11 +39,30 @@ def resource_path(relative_path):
 # BASE_DIR now refers to the directory containing the executable
 BASE_DIR_EXE = get_executable_dir_path()
 
+SETTINGS_PATH = BASE_DIR_EXE / "configs" / "settings.json"
+_settings_cache = None
+_settings_lock = threading.Lock()
+
 def load_settings():
-    settings_path = BASE_DIR_EXE / "configs" / "settings.json"
-    setf = open(settings_path, "r")
-    settings = json.load(setf)
-    return settings
+    """ Returns a copy of settings.json, the file is only read again after save_settings or invalidate_settings """
+    global _settings_cache
+    with _settings_lock:
+        if _settings_cache is None:
+            with open(SETTINGS_PATH, "r") as setf:
+                _settings_cache = json.load(setf)
+        return dict(_settings_cache)
+
+def save_settings(settings):
+    global _settings_cache
+    with _settings_lock:
+        with open(SETTINGS_PATH, "w") as f:
+            json.dump(settings, f, indent=4)
+        _settings_cache = dict(settings)
+
+def invalidate_settings():
+    global _settings_cache
+    with _settings_lock:
+        _settings_cache = None
 
 def center_window(window, parent=None, width=None, height=None):
     """